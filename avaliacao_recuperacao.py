@@ -0,0 +1,224 @@
+# avaliacao_recuperacao.py
+import argparse
+import itertools
+import json
+import math
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import lancedb
+
+from config import DOCUMENTS_DIR, CHUNK_SIZE, CHUNK_OVERLAP, TOP_K_RESULTS
+from deduplicador import normalize_chunk_text
+from manutencao import directory_size_mb
+from processador_documentos import load_documents_from_directory
+from rag_pipeline import RAGPipeline
+from utils import app_logger
+
+# Estimativa de tokens do prompt: ~4 caracteres por token (o tokenizador do LLM roda no Ollama).
+CHARS_PER_TOKEN = 4
+
+
+def load_labelled_questions(dataset_path: str) -> list[dict]:
+    """
+    Lê o conjunto rotulado em JSONL. Cada linha: {"question": ..., "expected_source": "arquivo.pdf",
+    "expected_passage": "trecho opcional que deve estar no chunk recuperado"}.
+    """
+    questions = []
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if not item.get("question") or not item.get("expected_source"):
+                raise ValueError(f"Linha {line_num} de {dataset_path}: 'question' e 'expected_source' são obrigatórios.")
+            questions.append(item)
+    if not questions:
+        raise ValueError(f"{dataset_path} não contém perguntas rotuladas.")
+    return questions
+
+
+def parse_index_spec(spec: str) -> dict:
+    """
+    Converte a especificação de índice da linha de comando em parâmetros de create_index:
+    'none' (busca exaustiva), 'auto' (padrão do LanceDB, como na ingestão) ou
+    'ivf_pq:<num_partitions>:<num_sub_vectors>'.
+    """
+    if spec == "none":
+        return None
+    if spec == "auto":
+        return {}
+    kind, _, params = spec.partition(":")
+    if kind == "ivf_pq":
+        num_partitions, num_sub_vectors = (int(value) for value in params.split(":"))
+        return {"num_partitions": num_partitions, "num_sub_vectors": num_sub_vectors}
+    raise ValueError(f"Especificação de índice inválida: '{spec}'. Use none, auto ou ivf_pq:<partições>:<sub_vetores>.")
+
+
+def _is_relevant(result: dict, item: dict) -> bool:
+    sources = set(result.get("sources") or []) | {result.get("source")}
+    if item["expected_source"] not in sources:
+        return False
+    passage = item.get("expected_passage")
+    if not passage:
+        return True
+    passage, text = normalize_chunk_text(passage), normalize_chunk_text(result.get("text", ""))
+    # O trecho esperado pode caber em um chunk ou ser maior que ele (chunk inteiro dentro do trecho).
+    return passage in text or (len(text) > 0 and text in passage)
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)]
+
+
+def evaluate_table(rag_pipe: RAGPipeline, table, questions: list[dict], question_vectors: list, top_k: int) -> dict:
+    """Calcula recall@k, MRR, latência de busca e tamanho estimado do prompt para uma tabela e um top-k."""
+    hits, reciprocal_ranks, latencies_ms, prompt_tokens = 0, [], [], []
+    for item, query_vector in zip(questions, question_vectors):
+        start = time.perf_counter()
+        results = table.search(query_vector).limit(top_k).to_list()
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+
+        rank = next((pos for pos, result in enumerate(results, start=1) if _is_relevant(result, item)), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+        prompt_tokens.append(len(rag_pipe._build_prompt(item["question"], results)) / CHARS_PER_TOKEN)
+
+    return {
+        "recall_at_k": hits / len(questions),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "search_latency_p50_ms": _percentile(latencies_ms, 0.5),
+        "search_latency_p95_ms": _percentile(latencies_ms, 0.95),
+        "prompt_tokens_est": statistics.mean(prompt_tokens),
+    }
+
+
+def run_sweep(dataset_path: str, documents_dir: str, chunk_sizes: list[int], overlaps: list[int],
+              top_ks: list[int], index_specs: list[str], keep_tables: bool = False) -> list[dict]:
+    """
+    Para cada combinação de chunk_size/overlap, ingere os documentos em uma tabela temporária
+    (em um LanceDB temporário, sem tocar na base real), cria uma cópia por configuração de
+    índice e mede qualidade e custo de cada top-k.
+    """
+    questions = load_labelled_questions(dataset_path)
+    rag_pipe = RAGPipeline(check_llm=False)
+    sweep_dir = tempfile.mkdtemp(prefix="sweep_lancedb_")
+    rag_pipe.db_conn = lancedb.connect(sweep_dir)
+    app_logger.info(f"Varredura: {len(questions)} perguntas, tabelas temporárias em {sweep_dir}")
+
+    start = time.perf_counter()
+    question_vectors = [vector.tolist() for vector in rag_pipe._encode([item["question"] for item in questions])]
+    query_embedding_ms = (time.perf_counter() - start) * 1000 / len(questions)
+
+    report = []
+    try:
+        for chunk_size, overlap in itertools.product(chunk_sizes, overlaps):
+            if overlap >= chunk_size:
+                app_logger.warning(f"Ignorando overlap {overlap} >= chunk_size {chunk_size}.")
+                continue
+            rag_pipe.CHUNK_SIZE, rag_pipe.CHUNK_OVERLAP = chunk_size, overlap
+            base_table_name = f"sweep_{chunk_size}_{overlap}"
+
+            start = time.perf_counter()
+            write_stats = rag_pipe._write_documents(load_documents_from_directory(documents_dir), base_table_name)
+            write_seconds = time.perf_counter() - start
+            if write_stats["rows"] == 0:
+                app_logger.warning(f"Nenhum chunk gerado para chunk_size={chunk_size}, overlap={overlap}.")
+                continue
+            base_table = rag_pipe.table
+
+            for index_spec in index_specs:
+                index_params = parse_index_spec(index_spec)
+                table = rag_pipe.db_conn.create_table(
+                    f"{base_table_name}_{index_spec.replace(':', '_')}", data=base_table.to_arrow()
+                )
+                index_seconds = 0.0
+                if index_params is not None:
+                    rag_pipe.table = table
+                    start = time.perf_counter()
+                    rag_pipe._create_vector_index(**index_params)
+                    index_seconds = time.perf_counter() - start
+                table_size_mb = directory_size_mb(os.path.join(sweep_dir, f"{table.name}.lance"))
+
+                for top_k in top_ks:
+                    row = {
+                        "chunk_size": chunk_size, "chunk_overlap": overlap, "index": index_spec, "top_k": top_k,
+                        "rows": write_stats["rows"],
+                        "ingest_seconds": round(write_seconds + index_seconds, 2),
+                        "table_size_mb": round(table_size_mb, 2),
+                        "query_embedding_ms": round(query_embedding_ms, 2),
+                    }
+                    row.update({k: round(v, 4) for k, v in evaluate_table(rag_pipe, table, questions, question_vectors, top_k).items()})
+                    report.append(row)
+                    app_logger.info(f"Configuração avaliada: {row}")
+    finally:
+        rag_pipe.close()
+        if keep_tables:
+            app_logger.info(f"Tabelas temporárias mantidas em {sweep_dir}")
+        else:
+            shutil.rmtree(sweep_dir, ignore_errors=True)
+    return report
+
+
+def pick_cheapest(report: list[dict], min_recall: float):
+    """Configuração mais barata (menos tokens de prompt, depois menor latência e tabela) com recall >= min_recall."""
+    eligible = [row for row in report if row["recall_at_k"] >= min_recall]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda row: (row["prompt_tokens_est"], row["search_latency_p50_ms"], row["table_size_mb"]))
+
+
+def print_report(report: list[dict], min_recall: float):
+    columns = ["chunk_size", "chunk_overlap", "index", "top_k", "recall_at_k", "mrr", "ingest_seconds",
+               "table_size_mb", "search_latency_p50_ms", "search_latency_p95_ms", "prompt_tokens_est"]
+    print("\t".join(columns))
+    for row in sorted(report, key=lambda r: (-r["recall_at_k"], r["prompt_tokens_est"])):
+        print("\t".join(str(row[column]) for column in columns))
+
+    best = pick_cheapest(report, min_recall)
+    if best:
+        print(f"\nConfiguração mais barata com recall@k >= {min_recall}: "
+              f"CHUNK_SIZE={best['chunk_size']}, CHUNK_OVERLAP={best['chunk_overlap']}, "
+              f"TOP_K_RESULTS={best['top_k']}, índice={best['index']}")
+    else:
+        print(f"\nNenhuma configuração atingiu recall@k >= {min_recall}.")
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Avalia qualidade (recall@k, MRR) e custo (ingestão, tamanho, latência, tokens) da recuperação "
+                    "para uma grade de chunk_size, overlap, top-k e índice."
+    )
+    parser.add_argument("--dataset", type=str, required=True,
+                        help="JSONL com perguntas rotuladas (question, expected_source, expected_passage opcional).")
+    parser.add_argument("--documents_dir", type=str, default=DOCUMENTS_DIR,
+                        help="Diretório com os documentos a ingerir nas tabelas temporárias.")
+    parser.add_argument("--chunk_sizes", type=_int_list, default=[CHUNK_SIZE], help="Ex: 400,700,1000")
+    parser.add_argument("--overlaps", type=_int_list, default=[CHUNK_OVERLAP], help="Ex: 0,70,140")
+    parser.add_argument("--top_k", type=_int_list, default=[TOP_K_RESULTS], help="Ex: 1,3,5")
+    parser.add_argument("--indexes", type=str, default="auto",
+                        help="Lista separada por vírgulas: none, auto, ivf_pq:<partições>:<sub_vetores>.")
+    parser.add_argument("--min_recall", type=float, default=0.8,
+                        help="Recall@k mínimo para recomendar a configuração mais barata.")
+    parser.add_argument("--output_json", type=str, default=None, help="Caminho para salvar o relatório completo em JSON.")
+    parser.add_argument("--keep_tables", action="store_true", help="Não apagar as tabelas temporárias ao final.")
+    args = parser.parse_args()
+
+    sweep_report = run_sweep(
+        args.dataset, args.documents_dir, args.chunk_sizes, args.overlaps, args.top_k,
+        [spec.strip() for spec in args.indexes.split(",") if spec.strip()], args.keep_tables
+    )
+    print_report(sweep_report, args.min_recall)
+    if args.output_json:
+        with open(args.output_json, 'w', encoding='utf-8') as f:
+            json.dump(sweep_report, f, ensure_ascii=False, indent=2)
+        print(f"Relatório salvo em: {args.output_json}")
@@ -0,0 +1,176 @@
+# cache_respostas.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from config import (
+    ANSWER_CACHE_PATH, ANSWER_CACHE_SIMILARITY_THRESHOLD, ANSWER_CACHE_TTL_HOURS, ANSWER_CACHE_MAX_ENTRIES
+)
+from deduplicador import compute_chunk_id
+from utils import app_logger, hot_path_logger
+
+# Campos do chunk que aparecem no prompt: se algum mudar (ex: nova fonte após re-ingestão),
+# a resposta em cache deixa de valer mesmo que o chunk_id (hash do texto) seja o mesmo.
+_FINGERPRINT_FIELDS = ("text", "source", "sources", "page", "section", "row_start", "row_end", "chunk_num")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    chunk_key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    embedding_model TEXT NOT NULL,
+    llm_model TEXT NOT NULL,
+    question TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS answers_lookup ON answers (chunk_key, embedding_model, llm_model);
+CREATE INDEX IF NOT EXISTS answers_lru ON answers (last_used_at);
+CREATE TABLE IF NOT EXISTS answer_chunks (
+    answer_id INTEGER NOT NULL REFERENCES answers (id) ON DELETE CASCADE,
+    collection TEXT NOT NULL,
+    chunk_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answer_chunks_by_chunk ON answer_chunks (collection, chunk_id);
+CREATE INDEX IF NOT EXISTS answer_chunks_by_answer ON answer_chunks (answer_id);
+"""
+
+
+def chunk_cache_id(chunk: dict) -> str:
+    """
+    ID do chunk usado no cache. Tabelas gravadas antes da deduplicação não têm a coluna
+    'chunk_id'; nelas o ID é derivado do texto, da mesma forma que na ingestão.
+    """
+    return chunk.get("chunk_id") or compute_chunk_id(chunk.get("text") or "")
+
+
+def _chunk_refs(chunks: list[dict]) -> list[tuple[str, str]]:
+    return sorted({(chunk.get("collection", ""), chunk_cache_id(chunk)) for chunk in chunks})
+
+
+def _chunk_fingerprint(chunks: list[dict]) -> str:
+    ordered = sorted(chunks, key=lambda chunk: (chunk.get("collection", ""), chunk_cache_id(chunk)))
+    payload = [[chunk.get(field) for field in _FINGERPRINT_FIELDS] for chunk in ordered]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Cache persistente (SQLite) de respostas do LLM. Uma resposta é reaproveitada quando a nova
+    pergunta recupera exatamente o mesmo conjunto de chunks, com o mesmo conteúdo, e seu embedding
+    tem similaridade de cosseno >= 'similarity_threshold' com o de uma pergunta já respondida.
+    Entradas expiram após 'ttl_hours' e, acima de 'max_entries', as menos usadas recentemente são
+    removidas. O arquivo pode ser compartilhado por vários processos (modo WAL).
+    """
+
+    def __init__(self, path: str = ANSWER_CACHE_PATH, similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                 ttl_hours: float = ANSWER_CACHE_TTL_HOURS, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Aberto apenas no primeiro uso: processos que só ingerem não criam o arquivo à toa.
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def lookup(self, query_embedding: list[float], chunks: list[dict], embedding_model: str, llm_model: str) -> Optional[str]:
+        """Retorna a resposta em cache para a pergunta e os chunks recuperados, ou None."""
+        chunk_key = json.dumps(_chunk_refs(chunks))
+        fingerprint = _chunk_fingerprint(chunks)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                "SELECT id, embedding, answer FROM answers WHERE chunk_key = ? AND fingerprint = ? "
+                "AND embedding_model = ? AND llm_model = ? AND created_at >= ?",
+                (chunk_key, fingerprint, embedding_model, llm_model, now - self.ttl_seconds),
+            ).fetchall()
+            if not rows:
+                return None
+
+            query = np.asarray(query_embedding, dtype=np.float32)
+            stored = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            similarities = stored @ query / (np.linalg.norm(stored, axis=1) * np.linalg.norm(query) + 1e-12)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+
+            answer_id, _, answer = rows[best]
+            conn.execute("UPDATE answers SET last_used_at = ?, hits = hits + 1 WHERE id = ?", (now, answer_id))
+            conn.commit()
+        hot_path_logger.info("Resposta obtida do cache (similaridade {:.3f}).", float(similarities[best]))
+        return answer
+
+    def store(self, question: str, query_embedding: list[float], chunks: list[dict], answer: str,
+              embedding_model: str, llm_model: str):
+        """Grava a resposta, removendo entradas expiradas e, se preciso, as menos usadas recentemente."""
+        refs = _chunk_refs(chunks)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO answers (chunk_key, fingerprint, embedding_model, llm_model, question, embedding, "
+                    "answer, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (json.dumps(refs), _chunk_fingerprint(chunks), embedding_model, llm_model, question,
+                     np.asarray(query_embedding, dtype=np.float32).tobytes(), answer, now, now),
+                )
+                conn.executemany(
+                    "INSERT INTO answer_chunks (answer_id, collection, chunk_id) VALUES (?, ?, ?)",
+                    [(cursor.lastrowid, collection, chunk_id) for collection, chunk_id in refs],
+                )
+                conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+                conn.execute(
+                    "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY last_used_at DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+
+    def invalidate_missing_chunks(self, collection_name: str, live_chunk_ids: set[str]) -> int:
+        """
+        Remove as respostas que citam chunks da coleção ausentes da versão ativa (alterados ou
+        removidos na re-ingestão, importação ou rollback). Retorna quantas respostas foram removidas.
+        """
+        with self._lock:
+            conn = self._connection()
+            cached_ids = {row[0] for row in conn.execute(
+                "SELECT DISTINCT chunk_id FROM answer_chunks WHERE collection = ?", (collection_name,)
+            )}
+            stale_ids = cached_ids - live_chunk_ids
+            if not stale_ids:
+                return 0
+            with conn:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS stale_chunks (chunk_id TEXT PRIMARY KEY)")
+                conn.execute("DELETE FROM stale_chunks")
+                conn.executemany("INSERT INTO stale_chunks VALUES (?)", [(cid,) for cid in stale_ids])
+                removed = conn.execute(
+                    "DELETE FROM answers WHERE id IN (SELECT answer_id FROM answer_chunks WHERE collection = ? "
+                    "AND chunk_id IN (SELECT chunk_id FROM stale_chunks))",
+                    (collection_name,),
+                ).rowcount
+        app_logger.info(f"Cache de respostas: {removed} respostas invalidadas na coleção '{collection_name}'.")
+        return removed
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
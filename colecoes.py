@@ -0,0 +1,193 @@
+# colecoes.py
+import json
+import os
+import re
+from datetime import datetime
+from typing import Optional
+
+from config import (
+    BASE_DIR, DEFAULT_COLLECTION, COLLECTIONS, COLLECTIONS_CONFIG_PATH, INGEST_STATE_DIR
+)
+from utils import app_logger
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_COLLECTION_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def load_collections() -> dict[str, dict]:
+    """
+    Retorna as coleções configuradas: {nome: {'table': ..., 'documents_dir': ...}}.
+    A coleção padrão vem de config.py; coleções adicionais podem ser declaradas em
+    COLLECTIONS_CONFIG_PATH (JSON no mesmo formato). Cada coleção tem sua própria tabela
+    no LanceDB, diretório de documentos e estado de ingestão.
+    """
+    collections = {name: dict(cfg) for name, cfg in COLLECTIONS.items()}
+
+    if os.path.exists(COLLECTIONS_CONFIG_PATH):
+        try:
+            with open(COLLECTIONS_CONFIG_PATH, 'r', encoding='utf-8') as f:
+                extra_collections = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            app_logger.error(f"Falha ao ler configuração de coleções '{COLLECTIONS_CONFIG_PATH}': {e}")
+            extra_collections = {}
+
+        for name, cfg in extra_collections.items():
+            if not _COLLECTION_NAME_RE.match(name):
+                app_logger.warning(f"Nome de coleção inválido ignorado: '{name}' (use letras, números, '_' ou '-').")
+                continue
+            cfg = dict(cfg or {})
+            cfg.setdefault("table", f"kb_{name}")
+            cfg.setdefault("documents_dir", os.path.join(BASE_DIR, "knowledge_base_documents", name))
+            if not os.path.isabs(cfg["documents_dir"]):
+                cfg["documents_dir"] = os.path.join(BASE_DIR, cfg["documents_dir"])
+            collections[name] = cfg
+
+    return collections
+
+
+def get_collection(name: str) -> dict:
+    """Retorna a configuração de uma coleção; lança ValueError se ela não existir."""
+    collections = load_collections()
+    if name not in collections:
+        raise ValueError(f"Coleção '{name}' não configurada. Coleções disponíveis: {sorted(collections)}")
+    return collections[name]
+
+
+def resolve_collection_names(names: Optional[list[str]] = None, all_collections: bool = False) -> list[str]:
+    """Resolve a seleção de coleções da linha de comando (nenhuma = coleção padrão)."""
+    if all_collections:
+        return sorted(load_collections())
+    if not names:
+        return [DEFAULT_COLLECTION]
+    for name in names:
+        get_collection(name)
+    return list(dict.fromkeys(names))
+
+
+def _ingest_state_path(name: str) -> str:
+    return os.path.join(INGEST_STATE_DIR, f"{name}.json")
+
+
+def load_ingest_state(name: str) -> dict:
+    """Lê o estado de ingestão da coleção (vazio se ela nunca foi ingerida)."""
+    path = _ingest_state_path(name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        app_logger.error(f"Falha ao ler estado de ingestão da coleção '{name}': {e}")
+        return {}
+
+
+def save_ingest_state(name: str, state: dict):
+    """Grava o estado de ingestão da coleção de forma atômica (arquivo temporário + os.replace)."""
+    os.makedirs(INGEST_STATE_DIR, exist_ok=True)
+    path = _ingest_state_path(name)
+    state = dict(state, collection=name, updated_at=datetime.now().isoformat(timespec="seconds"))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def ingest_state_mtime(name: str) -> Optional[int]:
+    """Data de modificação do estado de ingestão (None se não existir); usada para detectar trocas de versão."""
+    try:
+        return os.stat(_ingest_state_path(name)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_active_table_name(name: str) -> str:
+    """Nome da tabela atualmente ativa da coleção (a tabela base, se ela nunca passou por uma troca de versão)."""
+    return load_ingest_state(name).get("active_table") or get_collection(name)["table"]
+
+
+def table_version_prefix(name: str) -> str:
+    """Prefixo comum aos nomes das tabelas sombra versionadas da coleção."""
+    return f"{get_collection(name)['table']}__v"
+
+
+def new_table_version_name(name: str) -> str:
+    """Nome de uma nova tabela sombra versionada para a coleção, ex: 'knowledge_base__v20250101120000123456'."""
+    return f"{table_version_prefix(name)}{datetime.now():%Y%m%d%H%M%S%f}"
+
+
+def _table_write_marker_path(table_name: str) -> str:
+    return os.path.join(INGEST_STATE_DIR, f"{table_name}.writing")
+
+
+def mark_table_writing(table_name: str):
+    """Registra, com o PID do processo, que a tabela sombra está sendo gravada (a limpeza de versões a preserva)."""
+    os.makedirs(INGEST_STATE_DIR, exist_ok=True)
+    with open(_table_write_marker_path(table_name), 'w', encoding='utf-8') as f:
+        f.write(str(os.getpid()))
+
+
+def clear_table_writing(table_name: str):
+    try:
+        os.remove(_table_write_marker_path(table_name))
+    except FileNotFoundError:
+        pass
+
+
+def _process_alive(pid: int) -> bool:
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name == "posix":
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+    # Sem psutil fora do POSIX não há como verificar (os.kill encerraria o processo): assume vivo.
+    return True
+
+
+def is_table_being_written(table_name: str) -> bool:
+    """Indica se um processo ainda em execução está gravando a tabela. Marcadores de processos mortos são removidos."""
+    try:
+        with open(_table_write_marker_path(table_name), 'r', encoding='utf-8') as f:
+            pid = int(f.read().strip())
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        return True
+    if _process_alive(pid):
+        return True
+    clear_table_writing(table_name)
+    return False
+
+
+def activate_table_version(name: str, table_name: str, **state_updates) -> dict:
+    """
+    Torna 'table_name' a versão ativa da coleção com uma única escrita atômica do estado.
+    A versão ativa até então passa a ser 'previous_table' e fica disponível para rollback.
+    """
+    state = load_ingest_state(name)
+    previous_table = state.get("active_table") or get_collection(name)["table"]
+    versions = [v for v in state.get("versions", []) if v != table_name] + [table_name]
+    state.update(state_updates, active_table=table_name, previous_table=previous_table, versions=versions)
+    save_ingest_state(name, state)
+    app_logger.info(f"Coleção '{name}': versão ativa agora é '{table_name}' (anterior: '{previous_table}').")
+    return state
+
+
+def rollback_collection(name: str) -> str:
+    """Reativa a versão anterior da coleção (a atual vira a anterior). Retorna o nome da tabela reativada."""
+    state = load_ingest_state(name)
+    previous_table = state.get("previous_table")
+    if not previous_table:
+        raise ValueError(f"A coleção '{name}' não possui versão anterior para rollback.")
+    state.update(active_table=previous_table, previous_table=state.get("active_table"))
+    save_ingest_state(name, state)
+    app_logger.info(f"Coleção '{name}': rollback para a versão '{previous_table}'.")
+    return previous_table
@@ -7,7 +7,14 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DOCUMENTS_DIR = os.path.join(BASE_DIR, "knowledge_base_documents")
 VECTOR_DB_PATH = os.path.join(BASE_DIR, "data", "lancedb")
 LOG_FILE_PATH = os.path.join(BASE_DIR, "data", "agent.log")
-LOG_LEVEL = "INFO" 
+LOG_LEVEL = os.getenv("AGENT_LOG_LEVEL", "INFO")
+# Logs em JSON (uma linha por registro, com nível, módulo, função e campos extras) para análise.
+LOG_JSON = os.getenv("AGENT_LOG_JSON", "0") == "1"
+LOG_JSON_FILE_PATH = os.path.join(BASE_DIR, "data", "agent.jsonl")
+# As escritas nos sinks são feitas por uma thread de fundo, fora do caminho da ingestão e das consultas.
+LOG_ENQUEUE = True
+# Eventos de alta frequência (por lote, por chunk, por consulta) registram 1 a cada N ocorrências.
+LOG_SAMPLE_EVERY = int(os.getenv("AGENT_LOG_SAMPLE_EVERY", "20"))
 
 LLM_MODEL = "phi3:mini"
 
@@ -16,11 +23,93 @@ OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
 
 EMBEDDING_MODEL_NAME = "BAAI/bge-small-en-v1.5"
 
+# Serviço local de embeddings (python main.py serve-embeddings): vários processos reutilizam
+# um único modelo carregado. Se o serviço não estiver em execução, cada processo carrega o
+# modelo localmente, como antes.
+EMBEDDING_SERVICE_ENABLED = os.getenv("EMBEDDING_SERVICE_ENABLED", "1") == "1"
+EMBEDDING_SERVICE_HOST = "127.0.0.1"
+EMBEDDING_SERVICE_PORT = int(os.getenv("EMBEDDING_SERVICE_PORT", "8765"))
+EMBEDDING_SERVICE_TIMEOUT_SECONDS = 60
+# Tempo máximo da verificação inicial do serviço: um programa qualquer na porta não deve travar a inicialização.
+EMBEDDING_SERVICE_PING_TIMEOUT_SECONDS = 1.0
+EMBEDDING_SERVICE_MAX_BATCH = 64
+EMBEDDING_SERVICE_MAX_WAIT_MS = 10
+
 VECTOR_DB_TABLE_NAME = "knowledge_base"
 
+# Coleções: cada uma tem sua tabela, diretório de documentos e estado de ingestão próprios.
+# A coleção padrão usa a tabela e o diretório acima; outras podem ser declaradas em
+# collections.json, ex: {"rh": {"documents_dir": "knowledge_base_documents/rh"}}.
+DEFAULT_COLLECTION = "default"
+COLLECTIONS = {
+    DEFAULT_COLLECTION: {"table": VECTOR_DB_TABLE_NAME, "documents_dir": DOCUMENTS_DIR},
+}
+COLLECTIONS_CONFIG_PATH = os.path.join(BASE_DIR, "collections.json")
+INGEST_STATE_DIR = os.path.join(BASE_DIR, "data", "ingest_state")
+# Número máximo de buscas simultâneas quando uma pergunta consulta várias coleções.
+COLLECTION_SEARCH_WORKERS = 4
+# Pacotes pré-construídos da base (python main.py export-kb / import-kb).
+KB_EXPORT_DIR = os.path.join(BASE_DIR, "data", "exports")
+# Manutenção das tabelas (python main.py maintain): compactação de fragmentos, atualização do
+# índice e remoção de versões mais antigas que MAINTENANCE_VERSION_RETENTION_DAYS. Com
+# MAINTENANCE_INTERVAL_HOURS > 0, uma sessão 'ask' também executa a manutenção em segundo plano.
+MAINTENANCE_VERSION_RETENTION_DAYS = float(os.getenv("AGENT_MAINTENANCE_RETENTION_DAYS", "7"))
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("AGENT_MAINTENANCE_INTERVAL_HOURS", "0"))
+MAINTENANCE_LATENCY_SAMPLES = 20
+# Cache persistente de respostas: perguntas parecidas (similaridade >= ANSWER_CACHE_SIMILARITY_THRESHOLD)
+# que recuperam o mesmo conjunto de chunks reaproveitam a resposta do LLM. Desative com AGENT_ANSWER_CACHE=0.
+ANSWER_CACHE_ENABLED = os.getenv("AGENT_ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_PATH = os.path.join(BASE_DIR, "data", "answer_cache.sqlite3")
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.92
+ANSWER_CACHE_TTL_HOURS = 7 * 24
+ANSWER_CACHE_MAX_ENTRIES = 5000
+# API assíncrona (aretrieve / agenerate / aanswer_query): tempo máximo de cada etapa e número de
+# threads para embedding, busca e cache, que continuam síncronos.
+ASYNC_RETRIEVE_TIMEOUT_SECONDS = 30
+ASYNC_GENERATE_TIMEOUT_SECONDS = 300
+ASYNC_EXECUTOR_WORKERS = 4
+
 CHUNK_SIZE = 700 
 CHUNK_OVERLAP = 70 
 
+# Chunks são extraídos, embutidos e gravados no LanceDB em lotes deste tamanho,
+# para que documentos grandes não precisem caber inteiros em memória.
+INGEST_BATCH_SIZE = 256
+EMBEDDING_BATCH_SIZE = 32
+# Ingestão em paralelo (python main.py ingest --workers N): cada processo carrega o próprio
+# modelo de embedding, então o número efetivo de workers é limitado pelo teto de memória
+# (MEMORY_LIMIT_MB) considerando INGEST_WORKER_MEMORY_MB por worker. Requer o pacote 'pylance'.
+INGEST_WORKERS = int(os.getenv("AGENT_INGEST_WORKERS", "1"))
+INGEST_WORKER_MEMORY_MB = 1024
+
+# --- Governança de memória (máquinas de 8 GB, apenas CPU) ---
+# Teto de RSS do processo Python (o LLM roda à parte, no Ollama). Acima de
+# MEMORY_HIGH_WATERMARK do teto o batch de embeddings é reduzido; abaixo de
+# MEMORY_LOW_WATERMARK volta a crescer; gc.collect() só roda acima de MEMORY_GC_WATERMARK.
+MEMORY_LIMIT_MB = int(os.getenv("AGENT_MEMORY_LIMIT_MB", "3072"))
+MEMORY_HIGH_WATERMARK = 0.85
+MEMORY_LOW_WATERMARK = 0.60
+MEMORY_GC_WATERMARK = 0.75
+EMBEDDING_BATCH_SIZE_MIN = 4
+EMBEDDING_BATCH_SIZE_MAX = 64
+# Descarrega o modelo de embedding após este tempo ocioso em sessões longas (0 = nunca);
+# ele é recarregado automaticamente na próxima pergunta.
+EMBEDDING_IDLE_UNLOAD_SECONDS = int(os.getenv("EMBEDDING_IDLE_UNLOAD_SECONDS", "0"))
+
+# CSVs são lidos em janelas de linhas completas (cabeçalho repetido em cada chunk),
+# limitadas por CHUNK_SIZE caracteres ou por este número de linhas.
+CSV_MAX_ROWS_PER_CHUNK = 50
+
+# Deduplicação de chunks na ingestão: cópias exatas (após normalizar espaços/maiúsculas)
+# e quase duplicatas (MinHash com similaridade de Jaccard estimada >= DEDUP_SIMILARITY_THRESHOLD)
+# são indexadas uma única vez, com a lista de todas as fontes.
+DEDUP_ENABLED = True
+DEDUP_NEAR_DUPLICATES = True
+DEDUP_SIMILARITY_THRESHOLD = 0.9
+DEDUP_NUM_PERMUTATIONS = 64
+DEDUP_LSH_BANDS = 16
+DEDUP_SHINGLE_SIZE = 5
+
 TOP_K_RESULTS = 3 
 
 ENABLE_OCR = True 
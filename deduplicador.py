@@ -0,0 +1,295 @@
+# deduplicador.py
+import hashlib
+import re
+from typing import Optional
+
+import numpy as np
+
+from config import DEDUP_SIMILARITY_THRESHOLD, DEDUP_NUM_PERMUTATIONS, DEDUP_LSH_BANDS, DEDUP_SHINGLE_SIZE
+from utils import app_logger
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_chunk_text(text: str) -> str:
+    """Normaliza o texto para comparação: minúsculas e espaços colapsados."""
+    return _WHITESPACE_RE.sub(" ", text.lower()).strip()
+
+
+def compute_chunk_id(text: str) -> str:
+    """Identificador estável do chunk: hash do conteúdo normalizado (cópias exatas compartilham o ID)."""
+    return hashlib.blake2b(normalize_chunk_text(text).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _RowIndex:
+    """
+    Multimapa chave uint64 -> linhas (int32) em arrays numpy: tabela hash de endereçamento aberto
+    para as chaves, com as linhas de uma mesma chave encadeadas. Ocupa poucos bytes por entrada,
+    sem um objeto Python por chave, para que o índice caiba em memória com milhões de chunks.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._keys = np.zeros(capacity, dtype=np.uint64)  # 0 = posição vazia
+        self._heads = np.full(capacity, -1, dtype=np.int32)
+        self._entry_rows = np.empty(capacity, dtype=np.int32)
+        self._entry_next = np.empty(capacity, dtype=np.int32)
+        self._num_keys = 0
+        self._num_entries = 0
+
+    @staticmethod
+    def _normalize_key(key: int) -> int:
+        return key or 1
+
+    def _slot(self, key: int) -> int:
+        mask = len(self._keys) - 1
+        slot = key & mask
+        while True:
+            stored = int(self._keys[slot])
+            if stored == 0 or stored == key:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _grow_table(self):
+        old_keys, old_heads = self._keys, self._heads
+        self._keys = np.zeros(len(old_keys) * 2, dtype=np.uint64)
+        self._heads = np.full(len(old_keys) * 2, -1, dtype=np.int32)
+        for old_slot in np.flatnonzero(old_keys):
+            slot = self._slot(int(old_keys[old_slot]))
+            self._keys[slot] = old_keys[old_slot]
+            self._heads[slot] = old_heads[old_slot]
+
+    def add(self, key: int, row: int):
+        key = self._normalize_key(key)
+        if (self._num_keys + 1) * 2 > len(self._keys):
+            self._grow_table()
+        if self._num_entries == len(self._entry_rows):
+            self._entry_rows = np.resize(self._entry_rows, len(self._entry_rows) * 2)
+            self._entry_next = np.resize(self._entry_next, len(self._entry_next) * 2)
+        slot = self._slot(key)
+        if self._keys[slot] == 0:
+            self._keys[slot] = key
+            self._num_keys += 1
+        entry = self._num_entries
+        self._entry_rows[entry] = row
+        self._entry_next[entry] = self._heads[slot]
+        self._heads[slot] = entry
+        self._num_entries += 1
+
+    def rows(self, key: int):
+        entry = int(self._heads[self._slot(self._normalize_key(key))])
+        while entry != -1:
+            yield int(self._entry_rows[entry])
+            entry = int(self._entry_next[entry])
+
+    @property
+    def nbytes(self) -> int:
+        return self._keys.nbytes + self._heads.nbytes + self._entry_rows.nbytes + self._entry_next.nbytes
+
+
+def _hash_key(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class ChunkDeduplicator:
+    """
+    Detecta chunks duplicados exatos (mesmo hash do texto normalizado) e quase duplicados
+    (MinHash sobre shingles de palavras, com LSH por bandas para achar candidatos) antes
+    do cálculo dos embeddings. Guarda todas as fontes em que o conteúdo de cada chunk
+    canônico aparece (ver sources_of).
+
+    O estado cresce com o número de chunks únicos, por isso fica em arrays numpy indexados
+    pelo número da linha (ID, assinatura MinHash, primeira fonte); listas de fontes só existem
+    para chunks com mais de uma fonte. Chunks registrados com near_duplicates=False (ex: grupos
+    de linhas de CSV) só passam pela checagem exata e não guardam assinatura.
+    """
+
+    def __init__(self, threshold: float = DEDUP_SIMILARITY_THRESHOLD, num_permutations: int = DEDUP_NUM_PERMUTATIONS,
+                 bands: int = DEDUP_LSH_BANDS, shingle_size: int = DEDUP_SHINGLE_SIZE, near_duplicates: bool = True):
+        if num_permutations % bands != 0:
+            raise ValueError(f"num_permutations ({num_permutations}) deve ser múltiplo de bands ({bands}).")
+        self.threshold = threshold
+        self.num_permutations = num_permutations
+        self.bands = bands
+        self.rows_per_band = num_permutations // bands
+        self.shingle_size = shingle_size
+        self.near_duplicates = near_duplicates
+
+        rng = np.random.default_rng(1)
+        self._perm_a = rng.integers(1, _MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+        self._perm_b = rng.integers(0, _MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+
+        # Uma linha por chunk canônico registrado.
+        self._num_rows = 0
+        self._chunk_ids = np.empty(1024, dtype="S32")
+        self._first_source = np.empty(1024, dtype=np.int32)
+        self._signature_rows = np.empty(1024, dtype=np.int32)  # -1 = sem assinatura
+        self._alive = np.empty(1024, dtype=bool)
+        self._num_forgotten = 0
+        # Assinaturas MinHash, apenas dos chunks que passam pela checagem de quase duplicatas.
+        self._num_signatures = 0
+        self._signatures = np.empty((1024, num_permutations), dtype=np.uint32)
+
+        self._id_index = _RowIndex()
+        self._band_index = _RowIndex()
+        self._source_names: list[str] = []
+        self._source_numbers: dict[str, int] = {}
+        self._extra_sources: dict[int, list[str]] = {}
+        self.exact_duplicates = 0
+        self.near_duplicates_found = 0
+
+    def _minhash(self, normalized_text: str) -> np.ndarray:
+        words = normalized_text.split(" ")
+        if len(words) <= self.shingle_size:
+            shingles = {normalized_text}
+        else:
+            shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+            dtype=np.uint64, count=len(shingles)
+        )
+        # Permutações universais (a*x + b) mod p, como no MinHash clássico; o estouro em uint64 é aceitável aqui.
+        permuted = (np.outer(hashes, self._perm_a) + self._perm_b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> list[int]:
+        keys = []
+        for band in range(self.bands):
+            start = band * self.rows_per_band
+            keys.append(_hash_key(band.to_bytes(2, "little") + signature[start:start + self.rows_per_band].tobytes()))
+        return keys
+
+    def _find_near_duplicate(self, signature: np.ndarray, band_keys: list[int]) -> Optional[int]:
+        checked = set()
+        for key in band_keys:
+            for row in self._band_index.rows(key):
+                if row in checked or not self._alive[row]:
+                    continue
+                checked.add(row)
+                similarity = float(np.mean(self._signatures[self._signature_rows[row]] == signature))
+                if similarity >= self.threshold:
+                    return row
+        return None
+
+    def _find_row(self, chunk_id: str) -> Optional[int]:
+        encoded_id = chunk_id.encode("ascii")
+        for row in self._id_index.rows(_hash_key(encoded_id)):
+            if self._alive[row] and self._chunk_ids[row] == encoded_id:
+                return row
+        return None
+
+    def _source_number(self, source: str) -> int:
+        number = self._source_numbers.get(source)
+        if number is None:
+            number = self._source_numbers[source] = len(self._source_names)
+            self._source_names.append(source)
+        return number
+
+    def _add_row(self, chunk_id: str, source: str, signature: Optional[np.ndarray]) -> int:
+        row = self._num_rows
+        if row == len(self._chunk_ids):
+            new_size = 2 * row
+            self._chunk_ids = np.resize(self._chunk_ids, new_size)
+            self._first_source = np.resize(self._first_source, new_size)
+            self._signature_rows = np.resize(self._signature_rows, new_size)
+            self._alive = np.resize(self._alive, new_size)
+        self._chunk_ids[row] = chunk_id.encode("ascii")
+        self._first_source[row] = self._source_number(source)
+        self._alive[row] = True
+        self._signature_rows[row] = -1
+        if signature is not None:
+            if self._num_signatures == len(self._signatures):
+                self._signatures = np.resize(self._signatures, (2 * self._num_signatures, self.num_permutations))
+            self._signatures[self._num_signatures] = signature
+            self._signature_rows[row] = self._num_signatures
+            self._num_signatures += 1
+        self._num_rows += 1
+        return row
+
+    def register(self, chunk_id: str, text: str, source: str, near_duplicates: bool = True) -> Optional[str]:
+        """
+        Registra um chunk. Se ele for duplicata (exata ou aproximada) de um chunk já visto,
+        acrescenta 'source' às fontes do canônico e retorna o ID do canônico; caso contrário,
+        registra o chunk como canônico e retorna None. Com near_duplicates=False, apenas
+        duplicatas exatas são procuradas.
+        """
+        row = self._find_row(chunk_id)
+        if row is not None:
+            self.exact_duplicates += 1
+            self._add_source(row, source)
+            return chunk_id
+
+        signature = band_keys = None
+        if self.near_duplicates and near_duplicates:
+            signature = self._minhash(normalize_chunk_text(text))
+            band_keys = self._band_keys(signature)
+            row = self._find_near_duplicate(signature, band_keys)
+            if row is not None:
+                self.near_duplicates_found += 1
+                self._add_source(row, source)
+                return self._chunk_ids[row].decode("ascii")
+
+        row = self._add_row(chunk_id, source, signature)
+        self._id_index.add(_hash_key(chunk_id.encode("ascii")), row)
+        for key in band_keys or ():
+            self._band_index.add(key, row)
+        return None
+
+    def _add_source(self, row: int, source: str):
+        sources = self._extra_sources.get(row)
+        if sources is None:
+            first_source = self._source_names[self._first_source[row]]
+            if source == first_source:
+                return
+            sources = self._extra_sources[row] = [first_source]
+        if source not in sources:
+            sources.append(source)
+
+    def sources_of(self, chunk_id: str) -> list[str]:
+        """Todas as fontes em que o conteúdo do chunk canônico 'chunk_id' aparece."""
+        row = self._find_row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        return list(self._extra_sources.get(row) or [self._source_names[self._first_source[row]]])
+
+    def forget(self, chunk_ids):
+        """
+        Descarta chunks canônicos que não chegaram a ser gravados (ex: falha no embedding do lote),
+        junto com as fontes acumuladas; a próxima cópia do conteúdo passa a ser a canônica.
+        """
+        for chunk_id in chunk_ids:
+            row = self._find_row(chunk_id)
+            if row is None:
+                continue
+            self._alive[row] = False
+            self._extra_sources.pop(row, None)
+            self._num_forgotten += 1
+
+    @property
+    def duplicates_removed(self) -> int:
+        return self.exact_duplicates + self.near_duplicates_found
+
+    def memory_mb(self) -> float:
+        """Memória aproximada do estado da deduplicação (arrays, índices e listas de fontes)."""
+        arrays = (self._chunk_ids, self._first_source, self._signature_rows, self._alive, self._signatures)
+        total = sum(array.nbytes for array in arrays) + self._id_index.nbytes + self._band_index.nbytes
+        total += sum(len(name) + 50 for name in self._source_names)
+        total += sum(100 + 8 * len(sources) for sources in self._extra_sources.values())
+        return total / (1024 * 1024)
+
+    def report(self) -> dict:
+        """Resumo da deduplicação: chunks únicos, embeddings/linhas economizados e memória usada."""
+        stats = {
+            "unique_chunks": self._num_rows - self._num_forgotten,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates_found,
+            "embeddings_saved": self.duplicates_removed,
+            "dedup_memory_mb": round(self.memory_mb(), 2),
+        }
+        app_logger.info(
+            f"Deduplicação: {stats['unique_chunks']} chunks únicos; {stats['exact_duplicates']} duplicatas exatas e "
+            f"{stats['near_duplicates']} quase duplicatas descartadas ({stats['embeddings_saved']} embeddings/linhas economizados); "
+            f"{stats['dedup_memory_mb']} MB de estado."
+        )
+        return stats
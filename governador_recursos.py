@@ -0,0 +1,112 @@
+# governador_recursos.py
+import gc
+import os
+import sys
+import time
+
+from config import (
+    MEMORY_LIMIT_MB, EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_SIZE_MIN, EMBEDDING_BATCH_SIZE_MAX,
+    MEMORY_HIGH_WATERMARK, MEMORY_LOW_WATERMARK, MEMORY_GC_WATERMARK
+)
+from utils import app_logger
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_GC_MIN_INTERVAL_SECONDS = 2.0
+
+
+def get_process_rss_mb() -> float:
+    """
+    Memória residente (RSS) atual do processo, em MB. Usa psutil se instalado; no Linux lê
+    /proc/self/statm. Sem nenhuma das duas fontes, usa o pico (ru_maxrss) ou retorna 0.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss é em KB no Linux e em bytes no macOS.
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except (ImportError, OSError):
+        return 0.0
+
+
+class ResourceGovernor:
+    """
+    Acompanha o RSS do processo e adapta o consumo de memória a um teto (MEMORY_LIMIT_MB):
+    reduz o batch de embeddings pela metade acima da marca alta e volta a aumentá-lo abaixo
+    da marca baixa, limita o número de workers de ingestão ao que cabe no orçamento e só
+    executa gc.collect() quando o RSS passa da marca de coleta.
+    """
+
+    def __init__(self, memory_limit_mb: float = MEMORY_LIMIT_MB, initial_batch_size: int = EMBEDDING_BATCH_SIZE,
+                 min_batch_size: int = EMBEDDING_BATCH_SIZE_MIN, max_batch_size: int = EMBEDDING_BATCH_SIZE_MAX):
+        self.memory_limit_mb = memory_limit_mb
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self._batch_size = max(min_batch_size, min(initial_batch_size, max_batch_size))
+        self._last_gc_at = 0.0
+        self.peak_rss_mb = 0.0
+        self.gc_runs = 0
+
+    def rss_mb(self) -> float:
+        rss = get_process_rss_mb()
+        self.peak_rss_mb = max(self.peak_rss_mb, rss)
+        return rss
+
+    def memory_pressure(self) -> float:
+        """Fração do teto de memória em uso (0.0 se o teto estiver desativado)."""
+        if not self.memory_limit_mb:
+            return 0.0
+        return self.rss_mb() / self.memory_limit_mb
+
+    def embedding_batch_size(self) -> int:
+        """Batch de embeddings para o próximo lote, ajustado à pressão de memória atual."""
+        pressure = self.memory_pressure()
+        previous = self._batch_size
+        if pressure >= MEMORY_HIGH_WATERMARK and self._batch_size > self.min_batch_size:
+            self._batch_size = max(self.min_batch_size, self._batch_size // 2)
+        elif pressure <= MEMORY_LOW_WATERMARK and self._batch_size < self.max_batch_size:
+            self._batch_size = min(self.max_batch_size, self._batch_size * 2)
+        if self._batch_size != previous:
+            app_logger.debug("Batch de embeddings ajustado de {} para {} (uso de memória {:.0%}).", previous, self._batch_size, pressure)
+        return self._batch_size
+
+    def ingest_workers(self, requested: int, memory_per_worker_mb: float) -> int:
+        """Número de workers de ingestão que cabe no orçamento de memória restante (mínimo 1)."""
+        workers = max(1, min(requested, os.cpu_count() or 1))
+        if self.memory_limit_mb and memory_per_worker_mb > 0:
+            available_mb = self.memory_limit_mb - self.rss_mb()
+            workers = max(1, min(workers, int(available_mb // memory_per_worker_mb)))
+        return workers
+
+    def maybe_collect(self) -> bool:
+        """Executa gc.collect() apenas se o RSS passou da marca de coleta (e não rodou há pouco). Retorna se coletou."""
+        now = time.monotonic()
+        if now - self._last_gc_at < _GC_MIN_INTERVAL_SECONDS:
+            return False
+        if self.memory_pressure() < MEMORY_GC_WATERMARK:
+            return False
+        before = self.rss_mb()
+        gc.collect()
+        self._last_gc_at = time.monotonic()
+        self.gc_runs += 1
+        app_logger.debug("gc.collect() por pressão de memória: RSS {:.0f} MB -> {:.0f} MB.", before, self.rss_mb())
+        return True
+
+    def report(self) -> dict:
+        return {
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "memory_limit_mb": self.memory_limit_mb,
+            "final_embedding_batch_size": self._batch_size,
+            "gc_runs": self.gc_runs,
+        }
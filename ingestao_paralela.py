@@ -0,0 +1,203 @@
+# ingestao_paralela.py
+import heapq
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from config import INGEST_WORKER_MEMORY_MB
+from pacotes_kb import table_directory
+from processador_documentos import iter_document_segments
+from rag_pipeline import RAGPipeline, BatchStream
+from utils import app_logger
+
+try:
+    import lance
+    from lance.fragment import write_fragments
+except ImportError:
+    lance = None
+
+
+class _ShardWriter(RAGPipeline):
+    """
+    Pipeline de um worker: grava seus lotes como fragmentos Lance ainda não confirmados (o
+    coordenador confirma os de todos os workers de uma vez) e guarda as atualizações de fontes
+    para o coordenador.
+    """
+
+    def __init__(self, collection_name: str, dataset_uri: str, settings: dict):
+        # Cada worker usa o próprio modelo: passar pelo serviço compartilhado serializaria os embeddings.
+        super().__init__(collection_name, check_llm=False, use_embedding_service=False)
+        self.dataset_uri = dataset_uri
+        self.CHUNK_SIZE = settings["chunk_size"]
+        self.CHUNK_OVERLAP = settings["chunk_overlap"]
+        self.INGEST_BATCH_SIZE = settings["ingest_batch_size"]
+        self.fragments = []
+        self.pending_source_updates = {}
+        self.embedding_dim = None
+
+    def _store_batches(self, batches: Iterator[pa.Table], table_name: str):
+        first_batch = next(batches, None)
+        if first_batch is None:
+            return
+        stream = BatchStream(first_batch, batches)
+        try:
+            self.fragments = write_fragments(stream.reader(), self.dataset_uri, schema=stream.schema)
+        except Exception:
+            stream.reraise_original()
+            raise
+        self.embedding_dim = stream.schema.field("vector").type.list_size
+
+    def _update_chunk_sources(self, sources_by_id: dict[str, list[str]]):
+        self.pending_source_updates.update({cid: list(sources) for cid, sources in sources_by_id.items()})
+
+
+def _ingest_shard(collection_name: str, shard: list[tuple[str, str]], dataset_uri: str, settings: dict) -> dict:
+    """Executado em um processo worker: extrai, divide, deduplica, embute e grava os documentos do shard."""
+    try:
+        import torch
+        torch.set_num_threads(settings["torch_threads"])
+    except ImportError:
+        pass
+
+    writer = _ShardWriter(collection_name, dataset_uri, settings)
+    documents = [{"source": source, "path": path, "segments": iter_document_segments(path)} for source, path in shard]
+    try:
+        stats = writer._write_documents(documents, os.path.basename(dataset_uri))
+    finally:
+        writer.close()
+    return {
+        "stats": stats,
+        "fragments": writer.fragments,
+        "source_updates": writer.pending_source_updates,
+        "embedding_dim": writer.embedding_dim,
+    }
+
+
+def partition_documents(documents: list[dict], shards: int) -> list[list[tuple[str, str]]]:
+    """Divide os documentos em shards de tamanho (bytes) equilibrado: o maior arquivo vai para o shard mais leve."""
+    heap = [(0, index, []) for index in range(shards)]
+    for doc in sorted(documents, key=lambda d: os.path.getsize(d["path"]), reverse=True):
+        load, index, shard = heapq.heappop(heap)
+        shard.append((doc["source"], doc["path"]))
+        heapq.heappush(heap, (load + os.path.getsize(doc["path"]), index, shard))
+    return [shard for _, _, shard in sorted(heap, key=lambda item: item[1]) if shard]
+
+
+def _merge_shard_stats(shard_stats: list[dict]) -> dict:
+    merged = {}
+    for stats in shard_stats:
+        for key, value in stats.items():
+            if key == "peak_rss_mb":
+                merged[key] = max(merged.get(key, 0), value)
+            elif key in ("memory_limit_mb", "final_embedding_batch_size"):
+                merged.setdefault(key, value)
+            elif isinstance(value, (int, float)):
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _merge_cross_shard_duplicates(rag_pipe: RAGPipeline) -> int:
+    """
+    A deduplicação roda dentro de cada shard; chunks idênticos em shards diferentes só são
+    detectados aqui, após o commit (pelo chunk_id). Mantém uma linha por chunk_id, com a
+    união das fontes. Retorna quantas linhas foram removidas.
+    """
+    table = rag_pipe.table
+    ids = table.search().select(["chunk_id"]).limit(None).to_arrow()["chunk_id"]
+    counts = pc.value_counts(ids)
+    duplicated_ids = [entry["values"].as_py() for entry in counts if entry["counts"].as_py() > 1]
+    if not duplicated_ids:
+        return 0
+
+    where = "chunk_id IN ({})".format(", ".join(f"'{cid}'" for cid in duplicated_ids))
+    rows = table.search().where(where).limit(None).to_arrow().select(table.schema.names).to_pylist()
+    kept = {}
+    for row in rows:
+        if row["chunk_id"] not in kept:
+            kept[row["chunk_id"]] = row
+        else:
+            sources = kept[row["chunk_id"]]["sources"]
+            sources.extend(src for src in row["sources"] if src not in sources)
+    table.delete(where)
+    table.add(pa.Table.from_pylist(list(kept.values()), schema=table.schema))
+    return len(rows) - len(kept)
+
+
+def write_documents_sharded(rag_pipe: RAGPipeline, documents: list[dict], table_name: str, workers: int) -> dict:
+    """
+    Divide os documentos entre processos worker. Cada worker carrega o modelo de embedding e
+    grava seus lotes como fragmentos Lance no diretório da tabela; o coordenador confirma todos
+    os fragmentos em um único commit e aplica as fontes das duplicatas. O índice é criado uma
+    única vez depois, por ingest_documents. Sem o pacote 'pylance', com documentos sem arquivo
+    de origem ou com memória para um só worker, grava de forma sequencial.
+    """
+    if lance is None:
+        app_logger.warning("Pacote 'pylance' não instalado; ingestão paralela indisponível. Usando ingestão sequencial.")
+        return rag_pipe._write_documents(documents, table_name)
+    if not all(doc.get("path") for doc in documents):
+        app_logger.warning("Ingestão paralela requer documentos com arquivo de origem. Usando ingestão sequencial.")
+        return rag_pipe._write_documents(documents, table_name)
+
+    workers = min(rag_pipe.resource_governor.ingest_workers(workers, INGEST_WORKER_MEMORY_MB), len(documents))
+    if workers <= 1:
+        app_logger.info("Memória ou documentos suficientes para apenas 1 worker. Usando ingestão sequencial.")
+        return rag_pipe._write_documents(documents, table_name)
+
+    shards = partition_documents(documents, workers)
+    dataset_uri = table_directory(rag_pipe.db_conn.uri, table_name)
+    settings = {
+        "chunk_size": rag_pipe.CHUNK_SIZE,
+        "chunk_overlap": rag_pipe.CHUNK_OVERLAP,
+        "ingest_batch_size": rag_pipe.INGEST_BATCH_SIZE,
+        # Divide os núcleos entre os workers para não sobrecarregar a CPU com threads do torch.
+        "torch_threads": max(1, (os.cpu_count() or 1) // len(shards)),
+    }
+    app_logger.info(f"Ingestão paralela: {len(documents)} documentos em {len(shards)} workers ({settings['torch_threads']} threads cada).")
+
+    rag_pipe.table = None
+    try:
+        # 'spawn' evita herdar o modelo e as threads do torch do processo coordenador.
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(_ingest_shard, rag_pipe.collection_name, shard, dataset_uri, settings)
+                for shard in shards
+            ]
+            results = [future.result() for future in futures]
+
+        stats = _merge_shard_stats([result["stats"] for result in results])
+        stats["workers"] = len(shards)
+        fragments = [fragment for result in results for fragment in result["fragments"]]
+        if not fragments:
+            return stats
+
+        embedding_dim = next(result["embedding_dim"] for result in results if result["embedding_dim"])
+        lance.LanceDataset.commit(
+            dataset_uri, lance.LanceOperation.Overwrite(rag_pipe._build_table_schema(embedding_dim), fragments)
+        )
+        rag_pipe.table = rag_pipe.db_conn.open_table(table_name)
+        app_logger.info(f"{len(fragments)} fragmentos de {len(shards)} workers confirmados na tabela '{table_name}'.")
+
+        # Dois shards podem ter atualizado o mesmo chunk_id: as listas de fontes são unidas.
+        source_updates = {}
+        for result in results:
+            for chunk_id, sources in result["source_updates"].items():
+                merged_sources = source_updates.setdefault(chunk_id, [])
+                merged_sources.extend(src for src in sources if src not in merged_sources)
+        rag_pipe._update_chunk_sources(source_updates)
+
+        cross_shard_duplicates = _merge_cross_shard_duplicates(rag_pipe)
+        stats["cross_shard_duplicates"] = cross_shard_duplicates
+        stats["rows"] -= cross_shard_duplicates
+        if "unique_chunks" in stats:
+            stats["unique_chunks"] -= cross_shard_duplicates
+        return stats
+    except BaseException:
+        # Fragmentos não confirmados não formam uma tabela: o diretório é removido por inteiro
+        # (também em um Ctrl+C, para não deixar gigabytes de fragmentos órfãos).
+        shutil.rmtree(dataset_uri, ignore_errors=True)
+        raise
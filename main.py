@@ -7,40 +7,34 @@ import lancedb # Importar para a verificação da DB
 
 # Assegure-se que config.py e outros módulos .py estejam no mesmo diretório
 # ou que o Python possa encontrá-los (PYTHONPATH ou estrutura do projeto)
-from config import DOCUMENTS_DIR, OLLAMA_HOST, VECTOR_DB_PATH, VECTOR_DB_TABLE_NAME
+from config import OLLAMA_HOST, VECTOR_DB_PATH, INGEST_WORKERS, MAINTENANCE_VERSION_RETENTION_DAYS, MAINTENANCE_INTERVAL_HOURS
+from colecoes import get_active_table_name, get_collection, resolve_collection_names
+from manutencao import MaintenanceScheduler, maintain_collection
+from pacotes_kb import export_knowledge_base
 from processador_documentos import load_documents_from_directory
 from rag_pipeline import RAGPipeline
-from utils import app_logger # app_logger configurado em utils.py também imprime no terminal
+from utils import app_logger, setup_logger # app_logger configurado em utils.py também imprime no terminal
 
-print("DEBUG: Script main.py INICIADO.")
-
-def handle_ingestion(rag_pipe: RAGPipeline):
-     print("DEBUG: Função handle_ingestion INICIADA.")
-     app_logger.info(f"Iniciando ingestão de documentos do diretório: {DOCUMENTS_DIR}")
+def handle_ingestion(rag_pipe: RAGPipeline, collection_name: str, workers: int = 1, allow_partial: bool = False):
+     documents_dir = get_collection(collection_name)["documents_dir"]
+     app_logger.info(f"Iniciando ingestão da coleção '{collection_name}' a partir do diretório: {documents_dir}")
     
-     if not os.path.exists(DOCUMENTS_DIR) or not os.listdir(DOCUMENTS_DIR):
-         app_logger.error(f"Diretório de documentos '{DOCUMENTS_DIR}' não encontrado ou está vazio.")
-         print(f"DEBUG: Erro em handle_ingestion: Diretório de documentos '{DOCUMENTS_DIR}' não encontrado ou está vazio.")
+     if not os.path.exists(documents_dir) or not os.listdir(documents_dir):
+         app_logger.error(f"Diretório de documentos '{documents_dir}' não encontrado ou está vazio.")
          app_logger.error("Por favor, crie o diretório e adicione seus arquivos .pdf, .docx, .txt, .csv.")
-         print("DEBUG: Função handle_ingestion FINALIZADA (erro de diretório).")
          return
 
-     print("DEBUG: handle_ingestion - Carregando documentos...")
-     documents = load_documents_from_directory(DOCUMENTS_DIR)
+     documents = load_documents_from_directory(documents_dir)
      if not documents:
          app_logger.warning("Nenhum documento foi carregado. Verifique o diretório e os formatos dos arquivos.")
-         print("DEBUG: handle_ingestion - Nenhum documento carregado.")
-         print("DEBUG: Função handle_ingestion FINALIZADA (sem documentos).")
          return
     
-     print(f"DEBUG: handle_ingestion - {len(documents)} documentos carregados. Iniciando ingestão no RAG pipeline...")
-     rag_pipe.ingest_documents(documents) # Esta função em rag_pipeline.py também deve ter logs/prints
-     app_logger.info("Ingestão de documentos concluída.")
-     print("DEBUG: Função handle_ingestion FINALIZADA (sucesso).")
+     app_logger.info("{} documentos carregados. Iniciando ingestão no RAG pipeline...", len(documents))
+     stats = rag_pipe.ingest_documents(documents, collection_name, workers=workers, allow_partial=allow_partial) # Esta função em rag_pipeline.py também deve ter logs/prints
+     app_logger.info(f"Ingestão de documentos concluída: {stats}")
 
 
-def handle_query_cli(rag_pipe: RAGPipeline):
-    print("DEBUG: Função handle_query_cli INICIADA.")
+def handle_query_cli(rag_pipe: RAGPipeline, collections: list[str]):
     app_logger.info("Iniciando CLI de Perguntas e Respostas. Digite 'sair' ou 'exit' para terminar.")
     print("\nBem-vindo ao Agente de Base de Conhecimento Corporativo!")
     
@@ -59,10 +53,11 @@ def handle_query_cli(rag_pipe: RAGPipeline):
                  from config import LLM_MODEL as config_llm_model
                  llm_model_name_display = config_llm_model
         except Exception as e_ollama_cli:
-            print(f"DEBUG: handle_query_cli - Não foi possível obter nome do modelo LLM: {e_ollama_cli}")
             app_logger.warning(f"Não foi possível obter nome do modelo LLM: {e_ollama_cli}")
     
-    if rag_pipe.embedding_model: # sentence_transformers model object
+    if rag_pipe.embedding_client: # Serviço compartilhado (servico_embeddings.py)
+        embedding_model_name_display = f"{rag_pipe.EMBEDDING_MODEL_NAME} (serviço compartilhado)"
+    elif rag_pipe.embedding_model: # sentence_transformers model object
         # O nome do modelo de embedding é guardado em config.py e usado para carregar.
         # RAGPipeline deve armazenar o nome que usou.
         if hasattr(rag_pipe, 'EMBEDDING_MODEL_NAME'): # Se RAGPipeline armazena EMBEDDING_MODEL_NAME
@@ -78,6 +73,7 @@ def handle_query_cli(rag_pipe: RAGPipeline):
     print(f"Conectado ao LLM (Ollama): {llm_model_name_display}")
     print(f"Usando modelo de embedding: {embedding_model_name_display}")
     print(f"Consultando base em: {db_uri_display}")
+    print(f"Coleções: {', '.join(collections)}")
     print("----------------------------------------------------")
 
     while True:
@@ -89,9 +85,8 @@ def handle_query_cli(rag_pipe: RAGPipeline):
             if not query.strip():
                 continue
 
-            print(f"DEBUG: handle_query_cli - Query recebida: '{query}'")
             start_time = time.time()
-            answer = rag_pipe.answer_query(query) # Esta função em rag_pipeline.py deve ter logs/prints
+            answer = rag_pipe.answer_query(query, collections) # Esta função em rag_pipeline.py deve ter logs/prints
             end_time = time.time()
 
             print(f"\nResposta (em {end_time - start_time:.2f}s):")
@@ -100,139 +95,287 @@ def handle_query_cli(rag_pipe: RAGPipeline):
 
         except KeyboardInterrupt:
             app_logger.info("Interrupção pelo usuário. Saindo...")
-            print("\nDEBUG: handle_query_cli - KeyboardInterrupt recebido.")
             break
         except Exception as e:
-            app_logger.error(f"Erro durante o loop de query: {e}", exc_info=True)
-            print(f"DEBUG: handle_query_cli - Erro no loop de query: {e}")
+            app_logger.opt(exception=True).error(f"Erro durante o loop de query: {e}")
             print("Ocorreu um erro. Verifique os logs. Tente novamente ou saia.")
-    print("DEBUG: Função handle_query_cli FINALIZADA.")
+
+
+def collection_has_data(rag_pipeline_instance: RAGPipeline, table_name: str) -> bool:
+    """Verifica se a tabela de uma coleção existe no LanceDB e contém ao menos uma linha."""
+    db_exists = False
+    app_logger.debug("Verificando existência do DB em: {} e tabela '{}'", VECTOR_DB_PATH, table_name)
+    
+    if rag_pipeline_instance.db_conn:
+        try:
+            table_names_in_db = rag_pipeline_instance.db_conn.table_names()
+            app_logger.debug("Tabelas no DB: {}", table_names_in_db)
+            if table_name in table_names_in_db:
+                table = rag_pipeline_instance.db_conn.open_table(table_name)
+                table_length = 0
+                try: # Tenta obter o número de linhas
+                    table_length = table.to_lance().count_rows() # Forma recomendada e eficiente
+                except Exception as count_err:
+                    app_logger.debug("Falha ao usar table.to_lance().count_rows(): {}. Tentando len(table)...", count_err)
+                    try:
+                        table_length = len(table) # Pode ser menos eficiente para tabelas grandes
+                    except Exception as len_err:
+                        app_logger.debug("Falha ao usar len(table): {}. Verificando se há pelo menos 1 item.", len_err)
+                        # Verifica se há pelo menos um item de forma mais leve
+                        if next(table.search().limit(1).to_arrow(batch_size=1).to_reader(), None) is not None:
+                            table_length = 1 # Indica que a tabela não está vazia
+                        else:
+                            table_length = 0
+                
+                app_logger.debug("Tabela '{}' aberta, contagem de linhas (ou indicador de >0): {}", table.name, table_length)
+                if table_length > 0:
+                    db_exists = True
+                else:
+                    app_logger.warning(f"A tabela '{table.name}' existe mas está vazia (0 linhas).")
+            else:
+                app_logger.warning(f"A tabela '{table_name}' não foi encontrada no banco de dados ({table_names_in_db}).")
+        except lancedb.common.LanceDBClientError as e_lancedb: # Erro específico do LanceDB
+            app_logger.opt(exception=True).warning(f"Erro LanceDB ao verificar tabela: {e_lancedb}")
+        except Exception as e_tbl: # Outros erros
+            app_logger.opt(exception=True).error(f"Erro genérico ao verificar tabela: {e_tbl}")
+    else:
+        app_logger.warning("A conexão com o banco de dados vetorial não foi estabelecida na RAGPipeline.")
+    return db_exists
+
+
+def print_maintenance_report(report: dict):
+    print(f"\nColeção '{report['collection']}' (tabela '{report['table']}'): manutenção em {report['seconds']}s")
+    print(f"  {'métrica':<18}{'antes':>12}{'depois':>12}")
+    for key in ("rows", "fragments", "small_fragments", "unindexed_rows", "versions", "disk_mb", "query_p50_ms", "query_p95_ms"):
+        print(f"  {key:<18}{str(report['before'][key]):>12}{str(report['after'][key]):>12}")
 
 
 def main():
-    print("DEBUG: Função main() INICIADA.")
     parser = argparse.ArgumentParser(description="Agente de Base de Conhecimento Local Corporativo")
     parser.add_argument(
         "command",
-        choices=["ingest", "ask"],
-        help="Comando a ser executado: 'ingest' para processar documentos, 'ask' para iniciar a CLI de perguntas."
+        choices=["ingest", "ask", "rollback", "serve-embeddings", "export-kb", "import-kb", "maintain"],
+        help="Comando a ser executado: 'ingest' para processar documentos, 'ask' para iniciar a CLI de perguntas, "
+             "'rollback' para reativar a versão anterior da base, 'serve-embeddings' para iniciar o serviço "
+             "compartilhado de embeddings, 'export-kb'/'import-kb' para gerar/instalar um pacote pré-construído da base, "
+             "'maintain' para compactar as tabelas, atualizar o índice e remover versões antigas."
+    )
+    parser.add_argument(
+        "--collection",
+        action="append",
+        dest="collections",
+        metavar="NOME",
+        help="Coleção a ingerir ou consultar (pode ser repetido). Padrão: a coleção 'default'."
+    )
+    parser.add_argument(
+        "--all-collections",
+        action="store_true",
+        help="Ingerir ou consultar todas as coleções configuradas."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=INGEST_WORKERS,
+        help="ingest: número de processos para a ingestão paralela (padrão: INGEST_WORKERS em config.py)."
+    )
+    parser.add_argument(
+        "--allow-partial",
+        action="store_true",
+        help="ingest: ativa a nova versão mesmo que alguns chunks tenham falhado no embedding (padrão: mantém a versão atual)."
+    )
+    parser.add_argument(
+        "--output",
+        metavar="ARQUIVO",
+        help="export-kb: caminho do pacote a gerar (padrão: data/exports/<coleção>_<data>.kb.tar.gz)."
+    )
+    parser.add_argument(
+        "--bundle",
+        metavar="ARQUIVO",
+        help="import-kb: pacote gerado por export-kb a instalar."
+    )
+    parser.add_argument(
+        "--retention-days",
+        type=float,
+        default=MAINTENANCE_VERSION_RETENTION_DAYS,
+        help="maintain: remove versões da tabela mais antigas que N dias (padrão: MAINTENANCE_VERSION_RETENTION_DAYS)."
+    )
+    parser.add_argument(
+        "--every-hours",
+        type=float,
+        metavar="H",
+        help="maintain: repete a manutenção a cada H horas até Ctrl+C, em vez de executar uma única vez."
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["TRACE", "DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Nível de log desta execução (padrão: LOG_LEVEL em config.py ou AGENT_LOG_LEVEL)."
+    )
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="Grava também os logs em JSON (LOG_JSON_FILE_PATH), para análise."
     )
 
     args = None
     try:
-        print("DEBUG: Antes de parser.parse_args()")
         args = parser.parse_args()
-        print(f"DEBUG: Comando recebido: {args.command}")
+        if args.log_level or args.log_json:
+            setup_logger(args.log_level, True if args.log_json else None)
+        app_logger.debug("Comando recebido: {}", args.command)
     except SystemExit as e:
-        print(f"DEBUG: Erro no argparse (SystemExit): {e}. Provavelmente argumento inválido ou faltando.")
+        app_logger.debug("Argparse encerrou (SystemExit): {}. Provavelmente argumento inválido, faltando ou --help.", e)
         if args is None: # Se o parse falhou completamente
-             print("DEBUG: args é None após parse_args, saindo de main().")
              return
+
+    if args.command == "serve-embeddings":
+        # O serviço de embeddings não depende do Ollama nem do LanceDB.
+        from servico_embeddings import serve_embeddings
+        serve_embeddings()
+        return
+
+    try:
+        collection_names = resolve_collection_names(args.collections, args.all_collections)
+        app_logger.debug("Coleções selecionadas: {}", collection_names)
+    except ValueError as e:
+        app_logger.error(str(e))
+        print(f"Erro: {e}")
+        sys.exit(1)
+
+    if args.command == "export-kb":
+        # A exportação só copia a tabela ativa: não precisa do Ollama nem do modelo de embedding.
+        if args.output and len(collection_names) > 1:
+            print("Erro: --output só pode ser usado ao exportar uma única coleção.")
+            sys.exit(1)
+        for collection_name in collection_names:
+            try:
+                bundle_path = export_knowledge_base(collection_name, args.output)
+                print(f"Coleção '{collection_name}' exportada para: {bundle_path}")
+            except ValueError as e_export:
+                app_logger.error(str(e_export))
+                print(f"Erro: {e_export}")
+        return
+
+    if args.command == "maintain":
+        # A manutenção só reescreve arquivos do LanceDB: não precisa do Ollama nem do modelo de embedding.
+        if args.every_hours:
+            scheduler = MaintenanceScheduler(collection_names, args.every_hours, args.retention_days,
+                                             on_complete=print_maintenance_report)
+            scheduler.run_once()
+            scheduler.start()
+            try:
+                scheduler.wait()
+            except KeyboardInterrupt:
+                scheduler.stop()
+                print("\nManutenção agendada encerrada.")
+            return
+        for collection_name in collection_names:
+            report = maintain_collection(collection_name, args.retention_days)
+            if report:
+                print_maintenance_report(report)
+            else:
+                print(f"Coleção '{collection_name}' ainda não foi ingerida; nada a fazer.")
+        return
+
+    if args.command == "import-kb":
+        if not args.bundle:
+            print("Erro: informe o pacote com --bundle ARQUIVO.")
+            sys.exit(1)
+        import_pipeline = None
+        try:
+            # O modelo de embedding é carregado para validar a compatibilidade do pacote; o Ollama não é necessário.
+            import_pipeline = RAGPipeline(collection_names[0], check_llm=False)
+            table_name = import_pipeline.import_knowledge_base(args.bundle, args.collections[0] if args.collections else None)
+            print(f"Pacote '{args.bundle}' importado e ativado (tabela '{table_name}').")
+        except ValueError as e_import:
+            app_logger.error(str(e_import))
+            print(f"Erro: {e_import}")
+            sys.exit(1)
+        finally:
+            if import_pipeline:
+                import_pipeline.close()
+        return
     
     # Verifica a disponibilidade do Ollama
     try:
-        print("DEBUG: Verificando Ollama...")
         import ollama # Importa a biblioteca ollama
         # A instância do cliente Ollama será criada dentro da RAGPipeline
         # Mas podemos fazer um check rápido aqui se quisermos
         client = ollama.Client(host=OLLAMA_HOST)
         client.list() # Verifica se consegue listar modelos, indica que Ollama está respondendo
         app_logger.info(f"Ollama detectado e acessível em {OLLAMA_HOST}.")
-        print("DEBUG: Ollama OK.")
     except ImportError:
         app_logger.error("Biblioteca 'ollama' não encontrada. Por favor, instale com 'pip install ollama'.")
-        print("DEBUG: Erro fatal - Biblioteca 'ollama' não encontrada.")
         sys.exit(1)
     except Exception as e: # Captura outros erros de conexão com Ollama
         app_logger.error(f"Não foi possível conectar ao Ollama em {OLLAMA_HOST}. Verifique se está em execução.")
-        app_logger.error(f"Erro: {e}", exc_info=True)
-        print(f"DEBUG: Erro ao conectar com Ollama: {e}")
+        app_logger.opt(exception=True).error(f"Erro: {e}")
         print("Certifique-se de que o Ollama está instalado, em execução (`ollama serve`) e acessível.")
         print("Você pode baixá-lo em https://ollama.com/")
-        print("DEBUG: Função main() FINALIZADA (erro Ollama).")
         sys.exit(1)
 
     rag_pipeline_instance = None
+    maintenance_scheduler = None
     try:
-        print("DEBUG: Antes de instanciar RAGPipeline()")
-        rag_pipeline_instance = RAGPipeline() # RAGPipeline.__init__ também deve ter prints de DEBUG
-        print("DEBUG: RAGPipeline() instanciada com sucesso.")
+        rag_pipeline_instance = RAGPipeline(collection_names[0])
 
         if args.command == "ingest":
-            print("DEBUG: Comando 'ingest' selecionado.")
-            handle_ingestion(rag_pipeline_instance)
-        elif args.command == "ask":
-            print("DEBUG: Comando 'ask' selecionado.")
-            db_exists = False
-            print(f"DEBUG: Verificando existência do DB em: {VECTOR_DB_PATH} e tabela '{VECTOR_DB_TABLE_NAME}'")
-            
-            if rag_pipeline_instance.db_conn:
-                print(f"DEBUG: Conexão com DB (rag_pipeline_instance.db_conn) existe: {rag_pipeline_instance.db_conn.uri}")
+            failed_collections = []
+            for collection_name in collection_names:
+                # Uma coleção com falha (ex: embeddings parciais recusados) não impede as demais.
                 try:
-                    table_names_in_db = rag_pipeline_instance.db_conn.table_names()
-                    print(f"DEBUG: Tabelas no DB: {table_names_in_db}")
-                    if VECTOR_DB_TABLE_NAME in table_names_in_db:
-                        table = rag_pipeline_instance.db_conn.open_table(VECTOR_DB_TABLE_NAME)
-                        table_length = 0
-                        try: # Tenta obter o número de linhas
-                            table_length = table.to_lance().count_rows() # Forma recomendada e eficiente
-                        except Exception as count_err:
-                            print(f"DEBUG: Falha ao usar table.to_lance().count_rows(): {count_err}. Tentando len(table)...")
-                            try:
-                                table_length = len(table) # Pode ser menos eficiente para tabelas grandes
-                            except Exception as len_err:
-                                print(f"DEBUG: Falha ao usar len(table): {len_err}. Verificando se há pelo menos 1 item.")
-                                # Verifica se há pelo menos um item de forma mais leve
-                                if next(table.search().limit(1).to_arrow(batch_size=1).to_reader(), None) is not None:
-                                    table_length = 1 # Indica que a tabela não está vazia
-                                else:
-                                    table_length = 0
-                        
-                        print(f"DEBUG: Tabela '{table.name}' aberta, contagem de linhas (ou indicador de >0): {table_length}")
-                        if table_length > 0:
-                            db_exists = True
-                        else:
-                            app_logger.warning(f"A tabela '{table.name}' existe mas está vazia (0 linhas).")
-                            print(f"DEBUG: Tabela '{table.name}' existe mas está vazia.")
-                    else:
-                        app_logger.warning(f"A tabela '{VECTOR_DB_TABLE_NAME}' não foi encontrada no banco de dados ({table_names_in_db}).")
-                        print(f"DEBUG: Tabela '{VECTOR_DB_TABLE_NAME}' não encontrada nas tabelas existentes: {table_names_in_db}")
-                except lancedb.common.LanceDBClientError as e_lancedb: # Erro específico do LanceDB
-                    app_logger.warning(f"Erro LanceDB ao verificar tabela: {e_lancedb}", exc_info=True)
-                    print(f"DEBUG: Erro LanceDB ao verificar tabela: {e_lancedb}")
-                except Exception as e_tbl: # Outros erros
-                    app_logger.error(f"Erro genérico ao verificar tabela: {e_tbl}", exc_info=True)
-                    print(f"DEBUG: Erro genérico ao verificar tabela: {e_tbl}")
-            else:
-                print("DEBUG: rag_pipeline_instance.db_conn é None. A conexão com DB não foi estabelecida na RAGPipeline.")
+                    handle_ingestion(rag_pipeline_instance, collection_name, args.workers, args.allow_partial)
+                except RuntimeError as e_ingest:
+                    app_logger.opt(exception=True).error(f"Falha na ingestão da coleção '{collection_name}': {e_ingest}")
+                    print(f"Erro na coleção '{collection_name}': {e_ingest}")
+                    failed_collections.append(collection_name)
+            if failed_collections:
+                print(f"Ingestão falhou para as coleções: {', '.join(failed_collections)}.")
+                sys.exit(1)
+        elif args.command == "rollback":
+            for collection_name in collection_names:
+                try:
+                    restored_table = rag_pipeline_instance.rollback_collection(collection_name)
+                    print(f"Coleção '{collection_name}': versão '{restored_table}' reativada.")
+                except ValueError as e_rollback:
+                    app_logger.error(str(e_rollback))
+                    print(f"Erro: {e_rollback}")
+        elif args.command == "ask":
+            available_collections = []
+            for collection_name in collection_names:
+                table_name = get_active_table_name(collection_name)
+                if collection_has_data(rag_pipeline_instance, table_name):
+                    available_collections.append(collection_name)
+                else:
+                    app_logger.warning(f"A coleção '{collection_name}' está vazia ou não foi ingerida; ela será ignorada.")
+            db_exists = bool(available_collections)
 
-            print(f"DEBUG: db_exists = {db_exists}")
+            app_logger.debug("db_exists = {}", db_exists)
             if not db_exists:
                  app_logger.warning("A base de conhecimento parece estar vazia ou não foi criada.")
-                 print("DEBUG: DB não existe ou está vazia. Mostrando mensagem para o usuário.")
                  print("\nA base de conhecimento está vazia ou não foi criada.")
-                 print("Por favor, execute o comando 'ingest' primeiro: python main.py ingest")
+                 print("Por favor, execute o comando 'ingest' primeiro: python main.py ingest [--collection NOME]")
             else:
-                print("DEBUG: DB existe e tem dados. Chamando handle_query_cli().")
-                handle_query_cli(rag_pipeline_instance)
+                if MAINTENANCE_INTERVAL_HOURS > 0:
+                    # Após cada manutenção a sessão reabre a tabela compactada na próxima pergunta.
+                    maintenance_scheduler = MaintenanceScheduler(
+                        available_collections, MAINTENANCE_INTERVAL_HOURS,
+                        on_complete=lambda report: rag_pipeline_instance.refresh_collection_table(report["collection"]),
+                    )
+                    maintenance_scheduler.start()
+                handle_query_cli(rag_pipeline_instance, available_collections)
 
     except RuntimeError as e: # Erros críticos como modelo LLM não encontrado na RAGPipeline
-        print(f"DEBUG: RuntimeError capturado em main(): {e}")
-        app_logger.critical(f"Erro crítico de runtime: {e}", exc_info=True)
+        app_logger.opt(exception=True).critical(f"Erro crítico de runtime: {e}")
         print(f"Erro crítico: {e}. Verifique os logs e as instruções de configuração.")
     except Exception as e: # Outros erros inesperados
-        print(f"DEBUG: Exception genérica capturada em main(): {e}")
-        app_logger.critical(f"Ocorreu um erro inesperado no nível principal: {e}", exc_info=True)
+        app_logger.opt(exception=True).critical(f"Ocorreu um erro inesperado no nível principal: {e}")
         print(f"Um erro inesperado ocorreu: {e}. Consulte o arquivo agent.log para detalhes.")
     finally:
-        print("DEBUG: Bloco finally em main() alcançado.")
+        if maintenance_scheduler:
+            maintenance_scheduler.stop()
         if rag_pipeline_instance:
-            print("DEBUG: Chamando rag_pipeline_instance.close()")
             rag_pipeline_instance.close() # rag_pipeline.py deve ter o método close()
         # app_logger.info("Aplicação finalizada.") # Loguru já imprime no stderr, não precisa duplicar com print
-        print("DEBUG: Aplicação finalizada (do bloco finally de main()).")
 
 if __name__ == "__main__":
-    print("DEBUG: Bloco if __name__ == '__main__' ALCANÇADO.")
     main()
-    print("DEBUG: Script main.py FINALIZADO (após chamada main()).")
\ No newline at end of file
@@ -0,0 +1,138 @@
+# manutencao.py
+import os
+import statistics
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Optional
+
+import lancedb
+
+from config import VECTOR_DB_PATH, TOP_K_RESULTS, MAINTENANCE_VERSION_RETENTION_DAYS, MAINTENANCE_LATENCY_SAMPLES
+from colecoes import get_active_table_name
+from pacotes_kb import table_directory
+from utils import app_logger
+
+
+def directory_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / (1024 * 1024)
+
+
+def _unindexed_rows(table) -> Optional[int]:
+    indices = table.list_indices()
+    if not indices:
+        return None
+    return sum(table.index_stats(index.name).num_unindexed_rows for index in indices)
+
+
+def collect_table_metrics(table, db_path: str, sample_vectors: list) -> dict:
+    """Fragmentos, linhas fora do índice, versões, tamanho em disco e latência de busca (p50/p95) da tabela."""
+    fragment_stats = table.stats()["fragment_stats"]
+    latencies_ms = []
+    for vector in sample_vectors:
+        start = time.perf_counter()
+        table.search(vector).limit(TOP_K_RESULTS).to_list()
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+    latencies_ms.sort()
+    return {
+        "rows": table.count_rows(),
+        "fragments": fragment_stats["num_fragments"],
+        "small_fragments": fragment_stats["num_small_fragments"],
+        "unindexed_rows": _unindexed_rows(table),
+        "versions": len(table.list_versions()),
+        "disk_mb": round(directory_size_mb(table_directory(db_path, table.name)), 2),
+        "query_p50_ms": round(statistics.median(latencies_ms), 2) if latencies_ms else None,
+        "query_p95_ms": round(latencies_ms[int(0.95 * (len(latencies_ms) - 1))], 2) if latencies_ms else None,
+    }
+
+
+def maintain_collection(collection_name: str, retention_days: float = MAINTENANCE_VERSION_RETENTION_DAYS,
+                        db_path: str = VECTOR_DB_PATH) -> Optional[dict]:
+    """
+    Manutenção da tabela ativa da coleção: compacta fragmentos pequenos, inclui no índice
+    vetorial as linhas ainda não indexadas e remove versões mais antigas que 'retention_days'
+    (as recentes continuam disponíveis para leitores que ainda as usam). Retorna as métricas
+    antes/depois, ou None se a coleção ainda não foi ingerida.
+    """
+    table_name = get_active_table_name(collection_name)
+    db_conn = lancedb.connect(db_path)
+    if table_name not in db_conn.table_names():
+        app_logger.warning(f"Coleção '{collection_name}': tabela '{table_name}' não encontrada; manutenção ignorada.")
+        return None
+    table = db_conn.open_table(table_name)
+
+    # A latência é medida com vetores da própria tabela, sem precisar carregar o modelo de embedding.
+    sample = table.search().select(["vector"]).limit(MAINTENANCE_LATENCY_SAMPLES).to_arrow()
+    sample_vectors = [vector for vector in sample["vector"].to_pylist()]
+
+    before = collect_table_metrics(table, db_path, sample_vectors)
+    start = time.perf_counter()
+    table.optimize(cleanup_older_than=timedelta(days=retention_days))
+    elapsed_seconds = time.perf_counter() - start
+    after = collect_table_metrics(table, db_path, sample_vectors)
+
+    report = {
+        "collection": collection_name,
+        "table": table_name,
+        "seconds": round(elapsed_seconds, 2),
+        "before": before,
+        "after": after,
+    }
+    app_logger.info(
+        f"Manutenção da coleção '{collection_name}' em {elapsed_seconds:.1f}s: "
+        f"fragmentos {before['fragments']} -> {after['fragments']}, "
+        f"linhas fora do índice {before['unindexed_rows']} -> {after['unindexed_rows']}, "
+        f"versões {before['versions']} -> {after['versions']}, "
+        f"disco {before['disk_mb']} -> {after['disk_mb']} MB, "
+        f"latência p50 {before['query_p50_ms']} -> {after['query_p50_ms']} ms."
+    )
+    return report
+
+
+class MaintenanceScheduler:
+    """
+    Executa maintain_collection periodicamente em uma thread de fundo. 'on_complete' recebe o
+    relatório de cada coleção (ex: para que uma sessão aberta reabra a tabela compactada).
+    Apenas um processo por base deve ter o agendador ativo.
+    """
+
+    def __init__(self, collection_names: list[str], interval_hours: float,
+                 retention_days: float = MAINTENANCE_VERSION_RETENTION_DAYS,
+                 on_complete: Optional[Callable[[dict], None]] = None):
+        self.collection_names = collection_names
+        self.interval_seconds = interval_hours * 3600
+        self.retention_days = retention_days
+        self.on_complete = on_complete
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="kb-maintenance", daemon=True)
+
+    def start(self):
+        app_logger.info(f"Manutenção agendada a cada {self.interval_seconds / 3600:g}h para as coleções {self.collection_names}.")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def wait(self):
+        """Bloqueia até o agendador ser parado (uso em primeiro plano, ex: 'maintain --every-hours')."""
+        while self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+
+    def run_once(self):
+        for collection_name in self.collection_names:
+            if self._stop.is_set():
+                return
+            try:
+                report = maintain_collection(collection_name, self.retention_days)
+            except Exception as e:
+                app_logger.opt(exception=True).error(f"Falha na manutenção da coleção '{collection_name}': {e}")
+                continue
+            if report and self.on_complete:
+                self.on_complete(report)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.run_once()
@@ -0,0 +1,165 @@
+# pacotes_kb.py
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+from datetime import datetime
+from typing import Optional
+
+import lancedb
+
+from config import VECTOR_DB_PATH, EMBEDDING_MODEL_NAME, KB_EXPORT_DIR
+from colecoes import get_active_table_name, load_ingest_state
+from utils import app_logger
+
+# Pacote: tar.gz com 'manifest.json' (primeiro membro) e o diretório da tabela LanceDB
+# (dados, índices e versões) sob 'table/'. O manifesto traz a identidade do modelo de
+# embedding, o schema, o número de linhas e o SHA-256 de cada arquivo da tabela.
+BUNDLE_FORMAT_VERSION = 1
+_MANIFEST_NAME = "manifest.json"
+_TABLE_PREFIX = "table/"
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def schema_signature(schema) -> list[dict]:
+    """Representação do schema Arrow usada no manifesto e na verificação de compatibilidade."""
+    return [{"name": field.name, "type": str(field.type)} for field in schema]
+
+
+def table_directory(db_path: str, table_name: str) -> str:
+    return os.path.join(db_path, f"{table_name}.lance")
+
+
+def export_knowledge_base(collection_name: str, output_path: Optional[str] = None, db_path: str = VECTOR_DB_PATH) -> str:
+    """
+    Empacota a versão ativa da coleção em um único arquivo compactado, com manifesto e checksums.
+    Não carrega o modelo de embedding nem o LLM. Retorna o caminho do pacote gerado.
+    """
+    table_name = get_active_table_name(collection_name)
+    db_conn = lancedb.connect(db_path)
+    if table_name not in db_conn.table_names():
+        raise ValueError(f"A coleção '{collection_name}' não possui tabela ativa ('{table_name}'). Execute a ingestão primeiro.")
+    table = db_conn.open_table(table_name)
+    state = load_ingest_state(collection_name)
+
+    table_dir = table_directory(db_path, table_name)
+    files = {}
+    for root, _, filenames in os.walk(table_dir):
+        for filename in sorted(filenames):
+            path = os.path.join(root, filename)
+            relative_path = os.path.relpath(path, table_dir).replace(os.sep, "/")
+            files[relative_path] = {"sha256": _sha256_file(path), "size": os.path.getsize(path)}
+
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "collection": collection_name,
+        "table_name": table_name,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "embedding_model": {
+            "name": state.get("embedding_model", EMBEDDING_MODEL_NAME),
+            "dimension": table.schema.field("vector").type.list_size,
+        },
+        "schema": schema_signature(table.schema),
+        "rows": table.count_rows(),
+        "indices": [str(index) for index in table.list_indices()],
+        "ingest": {"last_ingest_at": state.get("last_ingest_at"), "stats": state.get("stats")},
+        "files": files,
+    }
+
+    if output_path is None:
+        output_path = os.path.join(KB_EXPORT_DIR, f"{collection_name}_{datetime.now():%Y%m%d%H%M%S}.kb.tar.gz")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    tmp_path = f"{output_path}.tmp"
+    with tarfile.open(tmp_path, "w:gz") as tar:
+        manifest_bytes = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+        manifest_info = tarfile.TarInfo(_MANIFEST_NAME)
+        manifest_info.size = len(manifest_bytes)
+        manifest_info.mtime = int(datetime.now().timestamp())
+        tar.addfile(manifest_info, io.BytesIO(manifest_bytes))
+        for relative_path in files:
+            tar.add(os.path.join(table_dir, relative_path), arcname=_TABLE_PREFIX + relative_path, recursive=False)
+    os.replace(tmp_path, output_path)
+
+    app_logger.info(
+        f"Coleção '{collection_name}' exportada para '{output_path}' "
+        f"({manifest['rows']} linhas, {len(files)} arquivos, {os.path.getsize(output_path) / (1024 * 1024):.1f} MB)."
+    )
+    return output_path
+
+
+def read_bundle_manifest(bundle_path: str) -> dict:
+    """Lê e valida o manifesto de um pacote sem extrair a tabela."""
+    try:
+        with tarfile.open(bundle_path, "r:*") as tar:
+            manifest_file = tar.extractfile(_MANIFEST_NAME)
+            manifest = json.load(manifest_file)
+    except (OSError, KeyError, tarfile.TarError, json.JSONDecodeError) as e:
+        raise ValueError(f"Pacote '{bundle_path}' inválido ou corrompido: {e}") from e
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise ValueError(
+            f"Versão de pacote não suportada: {manifest.get('format_version')} (esperada {BUNDLE_FORMAT_VERSION})."
+        )
+    return manifest
+
+
+def extract_bundle_table(bundle_path: str, manifest: dict, destination_dir: str):
+    """
+    Extrai a tabela do pacote para 'destination_dir', conferindo o SHA-256 de cada arquivo
+    durante a extração. Lança ValueError se um arquivo estiver corrompido, faltando, sobrando
+    ou com caminho fora do diretório da tabela.
+    """
+    expected_files = manifest["files"]
+    extracted = set()
+    with tarfile.open(bundle_path, "r:*") as tar:
+        for member in tar:
+            if member.name == _MANIFEST_NAME or member.isdir():
+                continue
+            relative_path = member.name[len(_TABLE_PREFIX):] if member.name.startswith(_TABLE_PREFIX) else None
+            normalized = os.path.normpath(relative_path) if relative_path else ""
+            if (not member.isfile() or not relative_path or os.path.isabs(normalized)
+                    or normalized.startswith("..") or relative_path not in expected_files):
+                raise ValueError(f"Membro inesperado no pacote: '{member.name}'.")
+
+            target_path = os.path.join(destination_dir, normalized)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            digest = hashlib.sha256()
+            with tar.extractfile(member) as source, open(target_path, 'wb') as target:
+                for block in iter(lambda: source.read(_HASH_BLOCK_SIZE), b""):
+                    digest.update(block)
+                    target.write(block)
+            if digest.hexdigest() != expected_files[relative_path]["sha256"]:
+                raise ValueError(f"Checksum divergente para '{relative_path}': o pacote está corrompido.")
+            extracted.add(relative_path)
+
+    missing = set(expected_files) - extracted
+    if missing:
+        raise ValueError(f"Pacote incompleto: {len(missing)} arquivos da tabela ausentes (ex: '{sorted(missing)[0]}').")
+
+
+def install_bundle_table(bundle_path: str, manifest: dict, db_path: str, table_name: str):
+    """
+    Extrai a tabela do pacote como 'table_name' no LanceDB. A extração é feita em um diretório
+    temporário no mesmo disco e só é renomeada para o nome final depois de todos os checksums
+    conferirem, então uma importação interrompida nunca deixa uma tabela parcial visível.
+    """
+    final_dir = table_directory(db_path, table_name)
+    staging_dir = os.path.join(db_path, f".import_{table_name}")
+    if os.path.exists(final_dir):
+        raise ValueError(f"A tabela '{table_name}' já existe no banco de dados.")
+    os.makedirs(db_path, exist_ok=True)
+    try:
+        extract_bundle_table(bundle_path, manifest, staging_dir)
+        os.replace(staging_dir, final_dir)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
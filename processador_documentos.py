@@ -1,8 +1,9 @@
 import os
 import csv
+import codecs
 from pypdf import PdfReader
 from docx import Document as DocxDocument
-from config import ENABLE_OCR 
+from config import ENABLE_OCR, CHUNK_SIZE, CSV_MAX_ROWS_PER_CHUNK
 from utils import app_logger
 
 if ENABLE_OCR:
@@ -27,109 +28,239 @@ def extract_text_from_txt(file_path: str) -> str:
         app_logger.error(f"Erro ao ler arquivo TXT {file_path}: {e}")
         return ""
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extrai texto de arquivos PDF (baseados em texto)."""
+def iter_pdf_pages(file_path: str):
+    """
+    Gera o texto de um PDF página a página, sem montar o documento inteiro em memória.
+    Cada segmento é um dicionário com 'text' e 'page' (numeração a partir de 1).
+    Se nenhuma página tiver texto extraível e o OCR estiver habilitado, gera um único
+    segmento com o resultado do OCR e 'page' = None.
+    """
     try:
         reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        if not text and ENABLE_OCR:
-            app_logger.info(f"PDF {file_path} não contém texto extraível. Tentando OCR...")
-            try:
-                parser = get_parser('ocr') 
-                kreis = Kreis(parser=parser)
-                parsed_doc = kreis.parse_file(file_path)
-                return parsed_doc.text_content if parsed_doc else ""
-            except Exception as e_ocr:
-                app_logger.error(f"Falha no OCR para PDF {file_path}: {e_ocr}")
-                return ""
-        return text
     except Exception as e:
         app_logger.error(f"Erro ao processar PDF {file_path}: {e}")
-        return ""
+        return
 
-def extract_text_from_docx(file_path: str) -> str:
-    """Extrai texto de arquivos DOCX."""
+    found_text = False
+    for page_num, page in enumerate(reader.pages, start=1):
+        try:
+            page_text = page.extract_text()
+        except Exception as e_page:
+            app_logger.warning(f"Falha ao extrair texto da página {page_num} de {file_path}: {e_page}")
+            continue
+        if page_text and page_text.strip():
+            found_text = True
+            yield {"text": page_text, "page": page_num}
+
+    if not found_text and ENABLE_OCR:
+        app_logger.info(f"PDF {file_path} não contém texto extraível. Tentando OCR...")
+        try:
+            parser = get_parser('ocr') 
+            kreis = Kreis(parser=parser)
+            parsed_doc = kreis.parse_file(file_path)
+            if parsed_doc and parsed_doc.text_content:
+                yield {"text": parsed_doc.text_content, "page": None}
+        except Exception as e_ocr:
+            app_logger.error(f"Falha no OCR para PDF {file_path}: {e_ocr}")
+
+def extract_text_from_pdf(file_path: str) -> str:
+    """Extrai texto de arquivos PDF (baseados em texto)."""
+    return "\n".join(segment["text"] for segment in iter_pdf_pages(file_path))
+
+def _is_heading_style(style_name: str) -> bool:
+    """Indica se o estilo de parágrafo do DOCX é um título (ex: 'Heading 1', 'Título 2')."""
+    style_name = (style_name or "").lower()
+    return style_name.startswith("heading") or style_name.startswith("título") or style_name == "title"
+
+def iter_docx_sections(file_path: str):
+    """
+    Gera o texto de um DOCX seção a seção, quebrando nos parágrafos com estilo de título.
+    Cada segmento é um dicionário com 'text', 'page' (sempre None, o DOCX não guarda
+    paginação) e 'section' (título da seção, ou None antes do primeiro título).
+    """
     try:
         doc = DocxDocument(file_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        return text
     except Exception as e:
         app_logger.error(f"Erro ao processar DOCX {file_path}: {e}")
-        return ""
+        return
+
+    section_title = None
+    paragraphs = []
+    for paragraph in doc.paragraphs:
+        style_name = paragraph.style.name if paragraph.style is not None else ""
+        if _is_heading_style(style_name):
+            if any(p.strip() for p in paragraphs):
+                yield {"text": "\n".join(paragraphs), "page": None, "section": section_title}
+            paragraphs = []
+            section_title = paragraph.text.strip() or section_title
+        paragraphs.append(paragraph.text)
+
+    if any(p.strip() for p in paragraphs):
+        yield {"text": "\n".join(paragraphs), "page": None, "section": section_title}
+
+def extract_text_from_docx(file_path: str) -> str:
+    """Extrai texto de arquivos DOCX."""
+    return "\n".join(segment["text"] for segment in iter_docx_sections(file_path))
+
+CSV_ENCODING_CANDIDATES = ("utf-8-sig", "cp1252", "latin-1")
+CSV_DELIMITER_CANDIDATES = ",;\t|"
+CSV_SNIFF_BYTES = 64 * 1024
+
+def detect_csv_format(file_path: str) -> tuple[str, type[csv.Dialect]]:
+    """
+    Detecta a codificação e o dialeto (delimitador, aspas) de um CSV lendo apenas uma amostra
+    do início do arquivo. Tenta UTF-8 (com ou sem BOM) e depois as codificações do Windows;
+    'latin-1' nunca falha e serve de último recurso. Sem amostra válida, assume vírgula.
+    """
+    with open(file_path, 'rb') as f:
+        sample_bytes = f.read(CSV_SNIFF_BYTES)
+
+    encoding = CSV_ENCODING_CANDIDATES[-1]
+    sample_text = ""
+    for candidate in CSV_ENCODING_CANDIDATES:
+        try:
+            # Decodificador incremental: a amostra pode terminar no meio de um caractere multibyte.
+            sample_text = codecs.getincrementaldecoder(candidate)().decode(sample_bytes, final=False)
+            encoding = candidate
+            break
+        except UnicodeDecodeError:
+            continue
+
+    # Descarta a última linha (possivelmente incompleta) antes de inferir o dialeto.
+    if len(sample_bytes) == CSV_SNIFF_BYTES and "\n" in sample_text:
+        sample_text = sample_text[:sample_text.rfind("\n")]
+
+    try:
+        dialect = csv.Sniffer().sniff(sample_text, delimiters=CSV_DELIMITER_CANDIDATES)
+    except csv.Error:
+        dialect = csv.excel
+
+    app_logger.debug("CSV {}: encoding={}, delimitador={!r}", os.path.basename(file_path), encoding, dialect.delimiter)
+    return encoding, dialect
+
+def _format_csv_row(row: list[str]) -> str:
+    return ", ".join([val if val else "N/A" for val in row])
+
+def iter_csv_segments(file_path: str, max_chars: int = CHUNK_SIZE, max_rows: int = CSV_MAX_ROWS_PER_CHUNK):
+    """
+    Lê um CSV em janelas limitadas de linhas, sem carregar o arquivo inteiro.
+    Cada segmento traz o cabeçalho repetido seguido de um grupo de linhas completas (até
+    'max_rows' linhas ou 'max_chars' caracteres), e registra 'row_start'/'row_end': a
+    numeração das linhas de dados (a primeira linha após o cabeçalho é a 1).
+    """
+    try:
+        encoding, dialect = detect_csv_format(file_path)
+        with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+            reader = csv.reader(f, dialect)
+            header = next(reader, None)
+            header_text = _format_csv_row(header) if header else ""
+
+            rows, rows_chars = [], 0
+            row_start = row_end = None
+            for row_num, row in enumerate(reader, start=1):
+                if not any(val.strip() for val in row):
+                    continue
+                row_text = _format_csv_row(row)
+                if rows and (len(rows) >= max_rows or len(header_text) + rows_chars + len(row_text) > max_chars):
+                    yield {"text": "\n".join([header_text] + rows), "page": None,
+                           "row_start": row_start, "row_end": row_end}
+                    rows, rows_chars = [], 0
+                if not rows:
+                    row_start = row_num
+                rows.append(row_text)
+                rows_chars += len(row_text) + 1
+                row_end = row_num
+
+            if rows:
+                yield {"text": "\n".join([header_text] + rows), "page": None,
+                       "row_start": row_start, "row_end": row_end}
+    except Exception as e:
+        app_logger.error(f"Erro ao processar CSV {file_path}: {e}")
 
 def extract_text_from_csv(file_path: str) -> str:
     """Extrai texto de arquivos CSV, tratando cada linha como um parágrafo."""
     try:
         text_content = []
-        with open(file_path, 'r', encoding='utf-8', newline='') as f:
-            reader = csv.reader(f)
+        encoding, dialect = detect_csv_format(file_path)
+        with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+            reader = csv.reader(f, dialect)
             header = next(reader, None)
             if header:
                 text_content.append(", ".join(header))
 
             for row in reader:
-                row_text = ", ".join([val if val else "N/A" for val in row])
-                text_content.append(row_text)
+                text_content.append(_format_csv_row(row))
         return "\n".join(text_content)
     except Exception as e:
         app_logger.error(f"Erro ao processar CSV {file_path}: {e}")
         return ""
 
+def _iter_single_segment(extractor, file_path: str):
+    """Adapta um extrator que retorna o texto completo para a interface de segmentos."""
+    content = extractor(file_path)
+    if content and content.strip():
+        yield {"text": content, "page": None}
+
+def _iter_ocr_segments(file_path: str):
+    """Gera um único segmento com o texto obtido via OCR (formatos não textuais)."""
+    try:
+        parser = get_parser('ocr') 
+        kreis = Kreis(parser=parser)
+        parsed_doc = kreis.parse_file(file_path)
+        if parsed_doc and parsed_doc.text_content:
+            yield {"text": parsed_doc.text_content, "page": None}
+        else:
+            app_logger.warning(f"Nenhum conteúdo OCR extraído de {os.path.basename(file_path)}.")
+    except Exception as e_ocr_generic:
+        app_logger.error(f"Falha no OCR para arquivo genérico {os.path.basename(file_path)}: {e_ocr_generic}")
+
+SEGMENT_EXTRACTORS = {
+    ".txt": lambda file_path: _iter_single_segment(extract_text_from_txt, file_path),
+    ".pdf": iter_pdf_pages,
+    ".docx": iter_docx_sections,
+    ".csv": iter_csv_segments,
+}
+
+def iter_document_segments(file_path: str):
+    """
+    Gera os segmentos de texto de um arquivo ({'text', 'page', ...}) sob demanda.
+    Formatos não suportados são enviados ao OCR quando ele está habilitado.
+    """
+    _, ext = os.path.splitext(file_path)
+    ext = ext.lower()
+    if ext in SEGMENT_EXTRACTORS:
+        yield from SEGMENT_EXTRACTORS[ext](file_path)
+    elif ENABLE_OCR:
+        app_logger.info(f"Tentando OCR para arquivo não textual: {os.path.basename(file_path)} (ext: {ext})")
+        yield from _iter_ocr_segments(file_path)
+
 def load_documents_from_directory(directory_path: str) -> list[dict]:
     """
-    Carrega e processa todos os documentos suportados de um diretório.
-    Retorna uma lista de dicionários, cada um contendo 'source' (nome do arquivo) e 'content'.
+    Lista os documentos suportados de um diretório, sem extrair o conteúdo ainda.
+    Retorna uma lista de dicionários, cada um contendo 'source' (nome do arquivo), 'path' e
+    'segments': um gerador que extrai o texto página a página (PDF), seção a seção (DOCX)
+    em grupos de linhas (CSV) ou de uma vez (TXT) somente quando for consumido pela ingestão.
     """
-    processed_documents = []
-    supported_extensions = {
-        ".txt": extract_text_from_txt,
-        ".pdf": extract_text_from_pdf,
-        ".docx": extract_text_from_docx,
-        ".csv": extract_text_from_csv,
-    }
+    documents = []
 
     if ENABLE_OCR:
         app_logger.info("Verificando dependências de OCR (Tesseract, Pandoc)...")
 
         pass
 
-
-    for filename in os.listdir(directory_path):
+    for filename in sorted(os.listdir(directory_path)):
         file_path = os.path.join(directory_path, filename)
-        if os.path.isfile(file_path):
-            _, ext = os.path.splitext(filename)
-            ext = ext.lower()
-            if ext in supported_extensions:
-                app_logger.info(f"Processando arquivo: {filename}...")
-                try:
-                    content = supported_extensions[ext](file_path)
-                    if content and content.strip():
-                        processed_documents.append({"source": filename, "content": content.strip()})
-                        app_logger.debug(f"Conteúdo extraído de {filename} (primeiros 100 chars): {content[:100].strip()}...")
-                    else:
-                        app_logger.warning(f"Nenhum conteúdo extraído ou conteúdo vazio para {filename}.")
-                except Exception as e:
-                    app_logger.error(f"Falha ao processar o arquivo {filename}: {e}")
-            elif ENABLE_OCR and ext not in ['.txt', '.csv']:
-                app_logger.info(f"Tentando OCR para arquivo não textual: {filename} (ext: {ext})")
-                try:
-                    parser = get_parser('ocr') 
-                    kreis = Kreis(parser=parser)
-                    parsed_doc = kreis.parse_file(file_path)
-                    if parsed_doc and parsed_doc.text_content:
-                        content = parsed_doc.text_content.strip()
-                        processed_documents.append({"source": filename, "content": content})
-                        app_logger.debug(f"Conteúdo OCR de {filename} (primeiros 100 chars): {content[:100].strip()}...")
-                    else:
-                         app_logger.warning(f"Nenhum conteúdo OCR extraído de {filename}.")
-                except Exception as e_ocr_generic:
-                    app_logger.error(f"Falha no OCR para arquivo genérico {filename}: {e_ocr_generic}")
-        
-
-
-    app_logger.info(f"Total de {len(processed_documents)} documentos processados com sucesso.")
-    return processed_documents
\ No newline at end of file
+        if not os.path.isfile(file_path):
+            continue
+        _, ext = os.path.splitext(filename)
+        ext = ext.lower()
+        if ext in SEGMENT_EXTRACTORS or ENABLE_OCR:
+            app_logger.debug("Arquivo agendado para processamento: {}", filename)
+            documents.append({
+                "source": filename,
+                "path": file_path,
+                "segments": iter_document_segments(file_path),
+            })
+
+    app_logger.info(f"Total de {len(documents)} documentos encontrados para processamento.")
+    return documents
@@ -1,71 +1,141 @@
 # rag_pipeline.py
+import asyncio
 import ollama
 import lancedb
 from sentence_transformers import SentenceTransformer 
 from tqdm import tqdm
 import gc
+import itertools
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterator, Optional
+import numpy as np
+import pyarrow as pa
 
 from config import (
-    LLM_MODEL, EMBEDDING_MODEL_NAME, VECTOR_DB_PATH, VECTOR_DB_TABLE_NAME,
-    CHUNK_SIZE, CHUNK_OVERLAP, TOP_K_RESULTS, PROMPT_TEMPLATE, OLLAMA_HOST
+    LLM_MODEL, EMBEDDING_MODEL_NAME, VECTOR_DB_PATH,
+    CHUNK_SIZE, CHUNK_OVERLAP, TOP_K_RESULTS, PROMPT_TEMPLATE, OLLAMA_HOST,
+    EMBEDDING_BATCH_SIZE, INGEST_BATCH_SIZE, DEDUP_ENABLED, DEDUP_NEAR_DUPLICATES,
+    DEFAULT_COLLECTION, COLLECTION_SEARCH_WORKERS, EMBEDDING_IDLE_UNLOAD_SECONDS, EMBEDDING_SERVICE_ENABLED,
+    ANSWER_CACHE_ENABLED, ASYNC_RETRIEVE_TIMEOUT_SECONDS, ASYNC_GENERATE_TIMEOUT_SECONDS, ASYNC_EXECUTOR_WORKERS
 )
-from utils import app_logger
+from cache_respostas import AnswerCache, chunk_cache_id
+from colecoes import (
+    get_collection, activate_table_version, get_active_table_name, ingest_state_mtime,
+    load_ingest_state, new_table_version_name, rollback_collection, save_ingest_state,
+    table_version_prefix, mark_table_writing, clear_table_writing, is_table_being_written
+)
+from deduplicador import ChunkDeduplicator, compute_chunk_id
+from governador_recursos import ResourceGovernor
+from pacotes_kb import install_bundle_table, read_bundle_manifest, schema_signature, table_directory
+from servico_embeddings import EmbeddingServiceClient, EmbeddingServiceError
+from utils import app_logger, hot_path_logger
+
+
+class BatchStream:
+    """
+    Expõe um iterador de lotes Arrow como RecordBatchReader, para que o Lance grave todos os lotes
+    em uma única escrita (uma versão e fragmentos de tamanho normal, em vez de um por lote). Uma
+    exceção do iterador chega ao chamador como RuntimeError do pyarrow; a original fica em 'error'.
+    """
+
+    def __init__(self, first_batch: pa.Table, batches: Iterator[pa.Table]):
+        self.schema = first_batch.schema
+        self.error = None
+        self._batches = itertools.chain([first_batch], batches)
+
+    def _iter_record_batches(self):
+        try:
+            for batch_table in self._batches:
+                yield from batch_table.to_batches()
+        except BaseException as e:
+            self.error = e
+            raise
+
+    def reader(self) -> pa.RecordBatchReader:
+        return pa.RecordBatchReader.from_batches(self.schema, self._iter_record_batches())
+
+    def reraise_original(self):
+        if self.error is not None:
+            raise self.error
 
-print("DEBUG: Script rag_pipeline.py INICIADO.")
 
 class RAGPipeline:  
-    def __init__(self): 
-        print("DEBUG: RAGPipeline __init__ INICIADO.")
-        app_logger.info("Inicializando RAGPipeline...")
+    LLM_ERROR_RESPONSE = "Desculpe, ocorreu um erro ao tentar gerar a resposta (LLM)."
+
+    def __init__(self, collection_name: str = DEFAULT_COLLECTION, check_llm: bool = True,
+                 use_embedding_service: bool = True): 
+        app_logger.info(f"Inicializando RAGPipeline (coleção padrão: '{collection_name}')...")
         
         self.embedding_model = None
+        self.embedding_client = None
+        # O lock protege o modelo de embedding contra descarregamento (por ociosidade) durante um encode.
+        self._embedding_lock = threading.Lock()
+        self._embedding_last_used = time.monotonic()
+        self._idle_monitor_stop = threading.Event()
+        self.resource_governor = ResourceGovernor()
         self.db_conn = None
         self.table = None
+        # Tabelas abertas para busca, por nome de coleção.
+        self.tables = {}
+        self._table_state_mtimes = {}
+        self._search_executor = None
+        # API assíncrona: threads para embedding/busca e cliente Ollama assíncrono (criados sob demanda).
+        self._async_executor = None
+        self._async_ollama_client = None
+        self._async_ollama_loop = None
+        self.answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
         
         self.LLM_MODEL = LLM_MODEL
         self.EMBEDDING_MODEL_NAME = EMBEDDING_MODEL_NAME
         self.VECTOR_DB_PATH = VECTOR_DB_PATH 
-        self.VECTOR_DB_TABLE_NAME = VECTOR_DB_TABLE_NAME
+        self.collection_name = collection_name
         self.OLLAMA_HOST = OLLAMA_HOST
         self.CHUNK_SIZE = CHUNK_SIZE
         self.CHUNK_OVERLAP = CHUNK_OVERLAP
         self.TOP_K_RESULTS = TOP_K_RESULTS
         self.PROMPT_TEMPLATE = PROMPT_TEMPLATE
-
-        print("DEBUG: RAGPipeline __init__ - Carregando modelo de embedding...")
-        self._load_embedding_model()
-        print("DEBUG: RAGPipeline __init__ - Conectando ao Vector DB...")
+        self.EMBEDDING_BATCH_SIZE = EMBEDDING_BATCH_SIZE
+        self.INGEST_BATCH_SIZE = INGEST_BATCH_SIZE
+        self.EMBEDDING_IDLE_UNLOAD_SECONDS = EMBEDDING_IDLE_UNLOAD_SECONDS
+
+        if EMBEDDING_SERVICE_ENABLED and use_embedding_service:
+            self._connect_embedding_service()
+        if self.embedding_client is None:
+            self._load_embedding_model()
+        if self.EMBEDDING_IDLE_UNLOAD_SECONDS > 0:
+            threading.Thread(target=self._idle_unload_monitor, name="embedding-idle-monitor", daemon=True).start()
         self._connect_vector_db()
-        print("DEBUG: RAGPipeline __init__ - Inicializando cliente Ollama...")
         self.ollama_client = ollama.Client(host=self.OLLAMA_HOST)
-        print("DEBUG: RAGPipeline __init__ - Verificando modelo Ollama...")
-        self._check_ollama_model()
-        print("DEBUG: RAGPipeline __init__ FINALIZADO.")
+        if check_llm: # Ferramentas que só usam embeddings/busca (ex: avaliacao_recuperacao.py) dispensam o Ollama.
+            self._check_ollama_model()
 
-    def _check_ollama_model(self):
-        print("DEBUG: RAGPipeline - _check_ollama_model INICIADO.")
+    @property
+    def VECTOR_DB_TABLE_NAME(self) -> str:
+        """Tabela ativa da coleção padrão, lida a cada acesso (muda após ingestão, importação ou rollback)."""
+        return get_active_table_name(self.collection_name)
 
+    def _check_ollama_model(self):
         def get_model_names_from_response(response_data): 
             names = []
             list_of_model_objects = [] 
 
-            print(f"DEBUG: RAGPipeline (helper) - Tipo de response_data recebido: {type(response_data)}")
-
             if isinstance(response_data, dict) and 'models' in response_data and isinstance(response_data['models'], list):
                 list_of_model_objects = response_data['models']
-                print("DEBUG: RAGPipeline (helper) - response_data é um dict, usando response_data['models'].")
 
             elif hasattr(response_data, 'models') and isinstance(response_data.models, list):
                 list_of_model_objects = response_data.models
-                print("DEBUG: RAGPipeline (helper) - response_data é um objeto com atributo .models (lista).")
 
             elif isinstance(response_data, list):
                 list_of_model_objects = response_data
-                print("DEBUG: RAGPipeline (helper) - response_data já é uma lista de modelos.")
 
             else:
                 app_logger.warning(f"Formato de response_data ({type(response_data)}) inesperado e não processável: {response_data}")
-                print(f"DEBUG: RAGPipeline (helper) - Formato de response_data não reconhecido.")
                 return names
             
             for model_obj in list_of_model_objects:
@@ -82,12 +152,10 @@ class RAGPipeline:
                 
                 if model_name_found:
                     names.append(model_name_found)
-                    print(f"DEBUG: RAGPipeline (helper) - Modelo da lista Ollama adicionado: {model_name_found}")
                 else:
                     app_logger.warning(f"Entrada de modelo ('{type(model_obj)}') em ollama.list() com formato inesperado ou sem atributo/chave de nome: {model_obj}")
-                    print(f"DEBUG: RAGPipeline (helper) - Entrada de objeto de modelo inválida: {model_obj}")
             
-            print(f"DEBUG: RAGPipeline (helper) - Nomes de modelos extraídos: {names}")
+            app_logger.debug("Nomes de modelos extraídos de ollama.list(): {}", names)
             return names
 
         models_info_response_initial = None
@@ -96,18 +164,15 @@ class RAGPipeline:
                 app_logger.error("Cliente Ollama não inicializado antes de _check_ollama_model.")
                 raise RuntimeError("Ollama client not initialized in RAGPipeline __init__")
 
-            print(f"DEBUG: RAGPipeline - Chamando self.ollama_client.list() (verificação inicial)")
             models_info_response_initial = self.ollama_client.list()
-            print(f"DEBUG: RAGPipeline - Resposta inicial de ollama.list(): {models_info_response_initial}")
             
             available_models = get_model_names_from_response(models_info_response_initial)
             
             target_llm = self.LLM_MODEL 
-            print(f"DEBUG: RAGPipeline - Verificando por LLM: '{target_llm}' em {available_models}")
+            app_logger.debug("Verificando por LLM '{}' em {}", target_llm, available_models)
 
             if target_llm not in available_models:
                 app_logger.warning(f"Modelo LLM '{target_llm}' não encontrado localmente via Ollama ({available_models}).")
-                print(f"DEBUG: RAGPipeline - Modelo '{target_llm}' NÃO encontrado. Tentando pull...")
                 
                 try:
                     import ollama 
@@ -116,62 +181,90 @@ class RAGPipeline:
                     app_logger.info(f"Pull do modelo '{target_llm}' solicitado/concluído.")
 
                     models_info_after_pull = self.ollama_client.list()
-                    print(f"DEBUG: RAGPipeline - Resposta de ollama.list() APÓS PULL: {models_info_after_pull}")
                     available_models = get_model_names_from_response(models_info_after_pull) 
-                    print(f"DEBUG: RAGPipeline - Lista de modelos APÓS PULL: {available_models}")
 
                     if target_llm not in available_models:
                         app_logger.error(f"Modelo LLM '{target_llm}' AINDA não encontrado mesmo após tentativa de pull.")
                         raise RuntimeError(f"Modelo LLM '{target_llm}' não disponível e falha ao efetivar o pull.")
                     else:
                         app_logger.info(f"Modelo LLM '{target_llm}' agora disponível após pull.")
-                        print(f"DEBUG: RAGPipeline - Modelo '{target_llm}' ENCONTRADO após pull.")
                 
                 except Exception as e_pull:
-                    app_logger.error(f"Falha na operação de pull para o modelo '{target_llm}': {e_pull}", exc_info=True)
+                    app_logger.opt(exception=True).error(f"Falha na operação de pull para o modelo '{target_llm}': {e_pull}")
                     raise RuntimeError(f"Falha ao tentar baixar o modelo '{target_llm}'. Detalhes: {e_pull}") from e_pull
             
             else:
                 app_logger.info(f"Modelo LLM '{target_llm}' encontrado localmente via Ollama.")
-                print(f"DEBUG: RAGPipeline - Modelo '{target_llm}' ENCONTRADO na verificação inicial.")
         
         except Exception as e: 
-            app_logger.error(f"Erro geral em _check_ollama_model (Host Ollama: {self.OLLAMA_HOST}): {e!r}", exc_info=True)
+            app_logger.opt(exception=True).error(f"Erro geral em _check_ollama_model (Host Ollama: {self.OLLAMA_HOST}): {e!r}")
             if models_info_response_initial is not None:
                  app_logger.error(f"Resposta inicial de ollama.list() (se obtida antes do erro): {models_info_response_initial}")
-            print(f"DEBUG: RAGPipeline - Exceção em _check_ollama_model: {e!r}")
             raise 
         
-        print("DEBUG: RAGPipeline - _check_ollama_model FINALIZADO.")
 
     def _load_embedding_model(self):
-        print("DEBUG: RAGPipeline _load_embedding_model INICIADO.")
         app_logger.info(f"Carregando modelo de embedding: {self.EMBEDDING_MODEL_NAME}")
         try:
             self.embedding_model = SentenceTransformer(self.EMBEDDING_MODEL_NAME, trust_remote_code=True)
             app_logger.info("Modelo de embedding carregado com sucesso.")
-            print(f"DEBUG: RAGPipeline _load_embedding_model: Modelo '{self.EMBEDDING_MODEL_NAME}' carregado.")
         except Exception as e:
-            app_logger.error(f"Falha ao carregar modelo de embedding '{self.EMBEDDING_MODEL_NAME}': {e}", exc_info=True)
-            print(f"DEBUG: RAGPipeline _load_embedding_model: ERRO ao carregar '{self.EMBEDDING_MODEL_NAME}': {e}")
+            app_logger.opt(exception=True).error(f"Falha ao carregar modelo de embedding '{self.EMBEDDING_MODEL_NAME}': {e}")
             raise
-        print("DEBUG: RAGPipeline _load_embedding_model FINALIZADO.")
+
+    def _connect_embedding_service(self):
+        """Usa o serviço compartilhado de embeddings, se estiver em execução com o mesmo modelo."""
+        client = EmbeddingServiceClient(self.EMBEDDING_MODEL_NAME)
+        if client.is_available():
+            self.embedding_client = client
+            app_logger.info(f"Usando o serviço compartilhado de embeddings em {client.address[0]}:{client.address[1]}.")
+        else:
+            app_logger.info("Serviço de embeddings não encontrado; o modelo será carregado neste processo.")
+
+    def _encode(self, texts, **encode_kwargs):
+        """
+        Gera embeddings pelo serviço compartilhado, se disponível; caso contrário (ou se o serviço
+        cair), pelo modelo local, recarregando-o se tiver sido descarregado por ociosidade.
+        """
+        if self.embedding_client is not None:
+            try:
+                return self.embedding_client.encode(texts)
+            except EmbeddingServiceError as e:
+                app_logger.warning(f"Falha no serviço de embeddings ({e}); usando o modelo local a partir de agora.")
+                self.embedding_client.close_connection()
+                self.embedding_client = None
+
+        with self._embedding_lock:
+            if self.embedding_model is None:
+                app_logger.info("Modelo de embedding ocioso havia sido descarregado; recarregando...")
+                self._load_embedding_model()
+            try:
+                return self.embedding_model.encode(texts, **encode_kwargs)
+            finally:
+                self._embedding_last_used = time.monotonic()
+
+    def _idle_unload_monitor(self):
+        """Descarrega o modelo de embedding após EMBEDDING_IDLE_UNLOAD_SECONDS sem uso (sessões 'ask' longas)."""
+        check_interval = max(1.0, min(30.0, self.EMBEDDING_IDLE_UNLOAD_SECONDS / 4))
+        while not self._idle_monitor_stop.wait(check_interval):
+            with self._embedding_lock:
+                idle_seconds = time.monotonic() - self._embedding_last_used
+                if self.embedding_model is None or idle_seconds < self.EMBEDDING_IDLE_UNLOAD_SECONDS:
+                    continue
+                self.embedding_model = None
+            gc.collect()
+            app_logger.info(f"Modelo de embedding descarregado após {idle_seconds:.0f}s ocioso (RSS: {self.resource_governor.rss_mb():.0f} MB).")
 
     def _connect_vector_db(self):
-        print("DEBUG: RAGPipeline _connect_vector_db INICIADO.")
         app_logger.info(f"Conectando ao banco de dados vetorial em: {self.VECTOR_DB_PATH}")
         try:
             self.db_conn = lancedb.connect(self.VECTOR_DB_PATH)
             app_logger.info("Conexão com LanceDB estabelecida.")
-            print(f"DEBUG: RAGPipeline _connect_vector_db: Conexão LanceDB OK para {self.VECTOR_DB_PATH}")
         except Exception as e:
-            app_logger.error(f"Falha ao conectar/criar LanceDB em '{self.VECTOR_DB_PATH}': {e}", exc_info=True)
-            print(f"DEBUG: RAGPipeline _connect_vector_db: ERRO {e}")
+            app_logger.opt(exception=True).error(f"Falha ao conectar/criar LanceDB em '{self.VECTOR_DB_PATH}': {e}")
             raise
-        print("DEBUG: RAGPipeline _connect_vector_db FINALIZADO.")
 
     def _simple_text_splitter(self, text: str, chunk_size: int, chunk_overlap: int) -> list[str]: 
-        print(f"DEBUG: RAGPipeline _simple_text_splitter: size={chunk_size}, overlap={chunk_overlap}, len_text={len(text)}")
         if not text:
             return []
         
@@ -196,188 +289,581 @@ class RAGPipeline:
                 remaining_text = text[last_chunk_added_end_idx:]
                 if remaining_text.strip():
                     final_chunks.append(remaining_text)
-                    print(f"DEBUG: RAGPipeline _simple_text_splitter: Adicionado chunk final restante de {len(remaining_text)} caracteres.")
 
         return [c for c in final_chunks if c.strip()]
 
-    def ingest_documents(self, documents: list[dict]):
-        print(f"DEBUG: RAGPipeline ingest_documents: Recebidos {len(documents)} documentos.")
-        app_logger.info(f"Iniciando processo de ingestão de {len(documents)} documentos...")
-        all_chunks_data = []
+    def _iter_document_chunks(self, doc: dict):
+        """
+        Gera (texto_do_chunk, segmento) de um documento, consumindo seus segmentos sob demanda.
+        Aceita documentos com 'segments' (gerador de processador_documentos) ou com 'content'.
+        """
+        segments = doc.get('segments')
+        if segments is None:
+            segments = [{"text": doc.get('content', ''), "page": None}]
+
+        for segment in segments:
+            segment_text = segment.get('text') or ''
+            if not segment_text.strip():
+                continue
+            if segment.get('row_start') is not None:
+                # Grupos de linhas de CSV já chegam no tamanho certo e não devem ser cortados no meio de uma linha.
+                yield segment_text, segment
+                continue
+            for chunk_text in self._simple_text_splitter(segment_text, self.CHUNK_SIZE, self.CHUNK_OVERLAP):
+                yield chunk_text, segment
+
+    def _build_table_schema(self, embedding_dim: int) -> pa.Schema:
+        """
+        Schema da tabela de chunks. 'page', 'section' e 'row_start'/'row_end' (CSV) são
+        nulos quando o formato não os possui. 'sources' lista todos os arquivos em que o
+        conteúdo do chunk (ou uma quase duplicata dele) aparece.
+        """
+        return pa.schema([
+            pa.field("vector", pa.list_(pa.float32(), embedding_dim)),
+            pa.field("chunk_id", pa.string()),
+            pa.field("text", pa.string()),
+            pa.field("source", pa.string()),
+            pa.field("sources", pa.list_(pa.string())),
+            pa.field("chunk_num", pa.int32()),
+            pa.field("page", pa.int32()),
+            pa.field("section", pa.string()),
+            pa.field("row_start", pa.int64()),
+            pa.field("row_end", pa.int64()),
+        ])
 
-        for doc_idx, doc in enumerate(tqdm(documents, desc="Processando Documentos para Ingestão")):
-            source_filename = doc['source']
-            text_content = doc['content']
-            print(f"DEBUG: RAGPipeline ingest_documents: Processando doc {doc_idx+1} '{source_filename}' ({len(text_content)} chars)")
+    def _chunks_to_arrow(self, chunks: list[dict], embeddings: np.ndarray) -> pa.Table:
+        """Monta um lote Arrow colunar a partir dos chunks e da matriz de embeddings."""
+        embedding_dim = embeddings.shape[1]
+        schema = self._build_table_schema(embedding_dim)
+        vectors = pa.FixedSizeListArray.from_arrays(
+            pa.array(embeddings.reshape(-1), type=pa.float32()), embedding_dim
+        )
+        columns = [vectors] + [
+            pa.array([chunk.get(field.name) for chunk in chunks], type=field.type)
+            for field in schema if field.name != "vector"
+        ]
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def _embed_chunk_batch(self, chunks: list[dict]) -> Optional[pa.Table]:
+        """Gera os embeddings de um lote de chunks. Retorna o lote Arrow, ou None se o embedding falhar."""
+        if not chunks:
+            return None
+
+        hot_path_logger.debug("Gerando embeddings para lote de {} chunks...", len(chunks))
+        try:
+            embeddings = self._encode(
+                [chunk["text"] for chunk in chunks],
+                show_progress_bar=False,
+                batch_size=self.resource_governor.embedding_batch_size()
+            )
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+        except Exception as e:
+            sources = sorted({chunk["source"] for chunk in chunks})
+            app_logger.opt(exception=True).error(f"Erro ao gerar embeddings para lote de {sources}: {e}")
+            return None
+
+        hot_path_logger.debug("Lote de {} chunks com embeddings gerados.", len(chunks))
+        return self._chunks_to_arrow(chunks, embeddings)
+
+    def _store_batches(self, batches: Iterator[pa.Table], table_name: str):
+        """
+        Cria a tabela de ingestão consumindo os lotes sob demanda, em uma única escrita do LanceDB.
+        Se não houver nenhum lote, a tabela não é criada (self.table fica None).
+        """
+        first_batch = next(batches, None)
+        if first_batch is None:
+            return
+        app_logger.info(f"Criando tabela sombra '{table_name}' no LanceDB...")
+        stream = BatchStream(first_batch, batches)
+        try:
+            self.table = self.db_conn.create_table(table_name, data=stream.reader(), schema=stream.schema)
+        except Exception:
+            stream.reraise_original()
+            raise
 
-            if not text_content or not text_content.strip():
-                app_logger.warning(f"Documento {source_filename} está vazio ou não contém texto. Pulando.")
-                continue
-            
-            app_logger.debug(f"Chunking documento: {source_filename}")
-            text_chunks = self._simple_text_splitter(text_content, self.CHUNK_SIZE, self.CHUNK_OVERLAP)
-            
-            app_logger.info(f"Documento '{source_filename}' dividido em {len(text_chunks)} chunks.")
-            print(f"DEBUG: RAGPipeline ingest_documents: Doc '{source_filename}' -> {len(text_chunks)} chunks.")
+    def _update_chunk_sources(self, sources_by_id: dict[str, list[str]]):
+        """Atualiza a coluna 'sources' de chunks já gravados que ganharam duplicatas em lotes posteriores."""
+        if not sources_by_id:
+            return
+        chunk_ids = sorted(sources_by_id)
+        updates = pa.table({
+            "chunk_id": pa.array(chunk_ids, type=pa.string()),
+            "sources": pa.array([sources_by_id[cid] for cid in chunk_ids], type=pa.list_(pa.string())),
+        })
+        self.table.merge_insert("chunk_id").when_matched_update_all().execute(updates)
+        app_logger.debug("Fontes atualizadas para {} chunks já gravados.", len(chunk_ids))
+
+    def _write_documents(self, documents: list[dict], table_name: str) -> dict:
+        """
+        Extrai, divide, deduplica, gera embeddings e grava os documentos em 'table_name'
+        (criada em uma única escrita, à medida que os lotes ficam prontos), sem criar índice.
+        Retorna as estatísticas da gravação.
+        """
+        total_documents = len(documents) if hasattr(documents, '__len__') else None
+        # Os segmentos de cada documento são extraídos, divididos e gravados em lotes de
+        # INGEST_BATCH_SIZE chunks, sem manter o corpus inteiro (nem seus vetores) em memória.
+        pending_chunks = []
+        total_rows = 0
+        total_chunks = 0
+        failed_chunks = 0
+        self.table = None
 
-            if not text_chunks:
-                app_logger.warning(f"Nenhum chunk gerado para {source_filename}. Pulando.")
-                continue
+        # Duplicatas são descartadas antes do embedding; se o chunk canônico já foi gravado
+        # em um lote anterior, suas fontes são atualizadas ao final.
+        deduplicator = ChunkDeduplicator(near_duplicates=DEDUP_NEAR_DUPLICATES) if DEDUP_ENABLED else None
+        pending_chunk_ids = set()
+        late_source_updates = set()
+
+        def flush_pending():
+            nonlocal total_rows, failed_chunks
+            chunks_in_batch = list(pending_chunks)
+            if deduplicator is not None:
+                # Fontes de duplicatas encontradas enquanto o chunk aguardava o lote.
+                for chunk in chunks_in_batch:
+                    chunk["sources"] = deduplicator.sources_of(chunk["chunk_id"])
+            batch_table = self._embed_chunk_batch(chunks_in_batch)
+            pending_chunks.clear()
+            pending_chunk_ids.clear()
+            if batch_table is not None:
+                total_rows += batch_table.num_rows
+            else:
+                failed_chunks += len(chunks_in_batch)
+                if deduplicator is not None:
+                    # Nada foi gravado: a próxima cópia desses conteúdos vira canônica e é embutida.
+                    deduplicator.forget(chunk["chunk_id"] for chunk in chunks_in_batch)
+            return batch_table
+
+        def embedded_batches():
+            nonlocal total_chunks
+            for doc in tqdm(documents, total=total_documents, desc="Processando Documentos para Ingestão"):
+                source_filename = doc['source']
+                doc_chunk_count = 0
+                hot_path_logger.debug("Chunking documento: {}", source_filename)
 
-            app_logger.debug(f"Gerando embeddings para chunks de {source_filename}...")
+                try:
+                    for chunk_text, segment in self._iter_document_chunks(doc):
+                        doc_chunk_count += 1
+                        chunk_id = compute_chunk_id(chunk_text)
+                        if deduplicator is not None:
+                            # Grupos de linhas de CSV só são comparados por igualdade exata:
+                            # o MinHash de cada um custaria memória sem achar quase duplicatas úteis.
+                            canonical_id = deduplicator.register(chunk_id, chunk_text, source_filename,
+                                                                 near_duplicates=segment.get('row_start') is None)
+                            if canonical_id is not None:
+                                if canonical_id not in pending_chunk_ids:
+                                    late_source_updates.add(canonical_id)
+                                continue
+                            pending_chunk_ids.add(chunk_id)
+
+                        pending_chunks.append({
+                            "chunk_id": chunk_id,
+                            "text": chunk_text,
+                            "source": source_filename,
+                            "sources": [source_filename],
+                            "chunk_num": doc_chunk_count,
+                            "page": segment.get('page'),
+                            "section": segment.get('section'),
+                            "row_start": segment.get('row_start'),
+                            "row_end": segment.get('row_end'),
+                        })
+                        if len(pending_chunks) >= self.INGEST_BATCH_SIZE:
+                            batch_table = flush_pending()
+                            if batch_table is not None:
+                                yield batch_table
+                except Exception as e:
+                    app_logger.opt(exception=True).error(f"Erro ao extrair/dividir {source_filename}: {e}")
+
+                total_chunks += doc_chunk_count
+                if doc_chunk_count == 0:
+                    app_logger.warning(f"Documento {source_filename} está vazio ou não contém texto. Pulando.")
+                    continue
+
+                hot_path_logger.info("Documento '{}' dividido em {} chunks.", source_filename, doc_chunk_count)
+                self.resource_governor.maybe_collect()
+
+            batch_table = flush_pending()
+            if batch_table is not None:
+                yield batch_table
+
+        self._store_batches(embedded_batches(), table_name)
+
+        stats = {"documents": total_documents, "chunks": total_chunks, "rows": total_rows, "failed_chunks": failed_chunks}
+        stats.update(self.resource_governor.report())
+        if deduplicator is not None:
+            stats.update(deduplicator.report())
+            if total_rows > 0:
+                self._update_chunk_sources({cid: deduplicator.sources_of(cid) for cid in late_source_updates})
+        return stats
+
+    def _create_vector_index(self, **index_params):
+        """Cria o índice vetorial da tabela de ingestão. Falhas apenas tornam a busca mais lenta."""
+        app_logger.info("Criando índice na tabela (pode levar tempo)...")
+        try:
+            self.table.create_index(**index_params)
+            app_logger.info(f"Índice criado com sucesso.")
+        except Exception as e_index:
+            app_logger.opt(exception=True).error(f"Falha ao criar índice: {e_index}. A busca pode ser mais lenta.")
+
+    def ingest_documents(self, documents: list[dict], collection_name: Optional[str] = None, workers: int = 1,
+                         allow_partial: bool = False) -> dict:
+        """
+        Extrai, divide, deduplica, gera embeddings e grava os documentos da coleção (a coleção
+        da pipeline, se nenhuma for informada) em uma nova tabela sombra versionada. A tabela
+        ativa continua atendendo consultas durante toda a ingestão; só depois de gravar os dados,
+        criar o índice e validar a contagem de linhas a nova versão é ativada (troca atômica do
+        estado da coleção). A versão anterior é mantida para rollback. Com workers > 1, os documentos
+        são divididos entre processos que gravam fragmentos da tabela em paralelo (ingestao_paralela.py).
+        Se algum lote falhar no embedding, a nova versão não é ativada, a menos que 'allow_partial' seja True.
+        Retorna estatísticas da ingestão (documentos, chunks, linhas gravadas e economia da deduplicação).
+        """
+        collection_name = collection_name or self.collection_name
+        table_name = new_table_version_name(collection_name)
+        total_documents = len(documents) if hasattr(documents, '__len__') else None
+        app_logger.info(f"Iniciando processo de ingestão de {total_documents} documentos na coleção '{collection_name}' (tabela '{table_name}')...")
+        mark_table_writing(table_name)
+        try:
             try:
+                if workers > 1:
+                    from ingestao_paralela import write_documents_sharded
+                    stats = write_documents_sharded(self, documents, table_name, workers)
+                else:
+                    stats = self._write_documents(documents, table_name)
+                total_rows = stats["rows"]
+
+                if stats.get("failed_chunks"):
+                    message = f"{stats['failed_chunks']} chunks não foram gravados por falha no embedding."
+                    if not allow_partial:
+                        raise RuntimeError(f"{message} A versão atual da coleção foi mantida (use allow_partial para ativar mesmo assim).")
+                    app_logger.warning(f"{message} A nova versão será ativada incompleta (allow_partial).")
+
+                if total_rows == 0:
+                    app_logger.warning("Nenhum dado para indexar após processar todos os documentos.")
+                    return stats
+
+                app_logger.info(f"Dados ({total_rows} chunks) adicionados à tabela '{table_name}'.")
+
+                # Criar índice para otimizar buscas
+                # Ajuste os parâmetros conforme o tamanho da sua base de dados e dimensão do embedding
+                # if total_rows > 100: # Heurística
+                #     app_logger.info("Criando índice IVF_PQ na tabela (pode levar tempo)...")
+                #     try:
+                #         # Obter dimensão do embedding dinamicamente
+                #         embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
+                #         num_partitions = min(max(1, int(total_rows**0.5 // 4)), 256) # Ajuste conforme necessidade
+                #         num_sub_vectors = embedding_dim // 4 # Comum para IVF_PQ, ajuste se necessário
+                #         if num_sub_vectors == 0 : num_sub_vectors = 1 # Evitar divisão por zero ou subvetor zero
+                #         if embedding_dim % num_sub_vectors != 0 : # Ajuste para ser divisível
+                #             # Encontrar o divisor mais próximo para num_sub_vectors
+                #             if embedding_dim > 16 : num_sub_vectors = 16 # Valor comum
+                #             else: num_sub_vectors = embedding_dim # Sem subvetores se dimensão muito pequena
+
+                #         if embedding_dim % num_sub_vectors != 0:
+                #            app_logger.warning(f"Dimensão do embedding {embedding_dim} não é divisível por num_sub_vectors {num_sub_vectors}. Pulando criação do índice PQ.")
+                #         else:
+                #             self.table.create_index(metric="L2",
+                #                                     num_partitions=num_partitions,
+                #                                     num_sub_vectors=num_sub_vectors,
+                #                                     replace=True)
+                #             app_logger.info(f"Índice IVF_PQ criado (partitions={num_partitions}, sub_vectors={num_sub_vectors}).")
+                #     except Exception as e_index:
+                #         app_logger.opt(exception=True).error(f"Falha ao criar índice IVF_PQ: {e_index}. A busca pode ser mais lenta.")
+                # else:
+                #     app_logger.info("Número de chunks pequeno, pulando criação de índice IVF_PQ complexo.")
+                # Simplificando a criação do índice por agora, LanceDB pode escolher bons defaults.
+                self._create_vector_index()
+
+                table_rows = self.table.count_rows()
+                if table_rows != total_rows:
+                    raise RuntimeError(
+                        f"Validação da tabela '{table_name}' falhou: {table_rows} linhas gravadas, {total_rows} esperadas."
+                    )
+
+            except BaseException as e:
+                # BaseException: um Ctrl+C no meio da gravação também não pode deixar a tabela sombra no disco.
+                if isinstance(e, Exception):
+                    app_logger.opt(exception=True).error(f"Erro durante a ingestão no LanceDB: {e}")
+                else:
+                    app_logger.warning(f"Ingestão interrompida ({type(e).__name__}); removendo a tabela sombra '{table_name}'.")
+                self._drop_table_quietly(table_name)
+                self.table = None
+                raise
+
+            activate_table_version(
+                collection_name, table_name,
+                last_ingest_at=datetime.now().isoformat(timespec="seconds"),
+                embedding_model=self.EMBEDDING_MODEL_NAME,
+                stats=stats,
+            )
+        finally:
+            # A marca de gravação impede que outro processo remova a tabela sombra durante a ingestão.
+            clear_table_writing(table_name)
 
-                chunk_embeddings = self.embedding_model.encode(
-                    text_chunks,
-                    show_progress_bar=False,
-                    batch_size=32 
-                )
-                app_logger.debug(f"{len(chunk_embeddings)} embeddings gerados para {source_filename}.")
-
-                for i, chunk_text in enumerate(text_chunks):
-                    all_chunks_data.append({
-                        "vector": chunk_embeddings[i].tolist(),
-                        "text": chunk_text,
-                        "source": source_filename,
-                        "chunk_num": i + 1
-                    })
-            except Exception as e:
-                app_logger.error(f"Erro ao gerar embeddings para {source_filename}: {e}", exc_info=True)
-                print(f"DEBUG: RAGPipeline ingest_documents: Erro embeddings doc '{source_filename}': {e}")
-                continue 
-
-            gc.collect()
+        self._prune_table_versions(collection_name)
+        self._invalidate_answer_cache(collection_name)
+        app_logger.info("Processo de ingestão de documentos concluído.")
+        return stats
 
-        if not all_chunks_data:
-            app_logger.warning("Nenhum dado para indexar após processar todos os documentos.")
-            print("DEBUG: RAGPipeline ingest_documents: Nenhum chunk de dados para indexar.")
+    def _invalidate_answer_cache(self, collection_name: str):
+        """Remove do cache as respostas baseadas em chunks que não existem na versão ativa da coleção."""
+        if self.answer_cache is None:
             return
+        try:
+            table = self.db_conn.open_table(get_active_table_name(collection_name))
+            if "chunk_id" in table.schema.names:
+                live_chunk_ids = set(table.search().select(["chunk_id"]).limit(None).to_arrow()["chunk_id"].to_pylist())
+            else:
+                texts = table.search().select(["text"]).limit(None).to_arrow()["text"].to_pylist()
+                live_chunk_ids = {chunk_cache_id({"text": text}) for text in texts}
+            self.answer_cache.invalidate_missing_chunks(collection_name, live_chunk_ids)
+        except Exception as e:
+            app_logger.warning(f"Falha ao invalidar o cache de respostas da coleção '{collection_name}': {e}")
 
-        app_logger.info(f"Total de {len(all_chunks_data)} chunks para serem adicionados ao LanceDB.")
-        print(f"DEBUG: RAGPipeline ingest_documents: Total {len(all_chunks_data)} chunks para LanceDB.")
-
+    def _drop_table_quietly(self, table_name: str):
+        """Remove uma tabela se ela existir, apenas registrando falhas (usado na limpeza de versões)."""
         try:
-            table_names = self.db_conn.table_names()
-            if self.VECTOR_DB_TABLE_NAME in table_names:
-                app_logger.info(f"Tabela '{self.VECTOR_DB_TABLE_NAME}' existente. Removendo antes de recriar.")
-                print(f"DEBUG: RAGPipeline ingest_documents: Removendo tabela antiga '{self.VECTOR_DB_TABLE_NAME}'.")
-                self.db_conn.drop_table(self.VECTOR_DB_TABLE_NAME)
-            
-            app_logger.info(f"Criando/Recriando tabela '{self.VECTOR_DB_TABLE_NAME}' no LanceDB...")
-            print(f"DEBUG: RAGPipeline ingest_documents: Criando tabela '{self.VECTOR_DB_TABLE_NAME}'.")
-            # Cria com um item para inferir schema, depois adiciona o resto
-            self.table = self.db_conn.create_table(self.VECTOR_DB_TABLE_NAME, data=all_chunks_data[:1], mode="overwrite")
-            if len(all_chunks_data) > 1:
-                 self.table.add(all_chunks_data[1:])
-            app_logger.info(f"Dados ({len(all_chunks_data)} chunks) adicionados à tabela '{self.VECTOR_DB_TABLE_NAME}'.")
-            print(f"DEBUG: RAGPipeline ingest_documents: Dados adicionados.")
-            
-            # Criar índice para otimizar buscas
-            # Ajuste os parâmetros conforme o tamanho da sua base de dados e dimensão do embedding
-            # if len(all_chunks_data) > 100: # Heurística
-            #     app_logger.info("Criando índice IVF_PQ na tabela (pode levar tempo)...")
-            #     print("DEBUG: RAGPipeline ingest_documents: Criando índice IVF_PQ...")
-            #     try:
-            #         # Obter dimensão do embedding dinamicamente
-            #         embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
-            #         num_partitions = min(max(1, int(len(all_chunks_data)**0.5 // 4)), 256) # Ajuste conforme necessidade
-            #         num_sub_vectors = embedding_dim // 4 # Comum para IVF_PQ, ajuste se necessário
-            #         if num_sub_vectors == 0 : num_sub_vectors = 1 # Evitar divisão por zero ou subvetor zero
-            #         if embedding_dim % num_sub_vectors != 0 : # Ajuste para ser divisível
-            #             # Encontrar o divisor mais próximo para num_sub_vectors
-            #             if embedding_dim > 16 : num_sub_vectors = 16 # Valor comum
-            #             else: num_sub_vectors = embedding_dim # Sem subvetores se dimensão muito pequena
-
-            #         if embedding_dim % num_sub_vectors != 0:
-            #            app_logger.warning(f"Dimensão do embedding {embedding_dim} não é divisível por num_sub_vectors {num_sub_vectors}. Pulando criação do índice PQ.")
-            #         else:
-            #             self.table.create_index(metric="L2",
-            #                                     num_partitions=num_partitions,
-            #                                     num_sub_vectors=num_sub_vectors,
-            #                                     replace=True)
-            #             app_logger.info(f"Índice IVF_PQ criado (partitions={num_partitions}, sub_vectors={num_sub_vectors}).")
-            #             print(f"DEBUG: RAGPipeline ingest_documents: Índice IVF_PQ criado.")
-            #     except Exception as e_index:
-            #         app_logger.error(f"Falha ao criar índice IVF_PQ: {e_index}. A busca pode ser mais lenta.", exc_info=True)
-            #         print(f"DEBUG: RAGPipeline ingest_documents: Erro ao criar índice IVF_PQ: {e_index}")
-            # else:
-            #     app_logger.info("Número de chunks pequeno, pulando criação de índice IVF_PQ complexo.")
-            # Simplificando a criação do índice por agora, LanceDB pode escolher bons defaults.
-            if len(all_chunks_data) > 0 :
-                 app_logger.info("Criando índice na tabela (pode levar tempo)...")
-                 print("DEBUG: RAGPipeline ingest_documents: Criando índice...")
-                 try:
-                     self.table.create_index()
-                     app_logger.info(f"Índice criado com sucesso.")
-                     print(f"DEBUG: RAGPipeline ingest_documents: Índice criado.")
-                 except Exception as e_index:
-                     app_logger.error(f"Falha ao criar índice: {e_index}. A busca pode ser mais lenta.", exc_info=True)
-                     print(f"DEBUG: RAGPipeline ingest_documents: Erro ao criar índice: {e_index}")
+            if table_name in self.db_conn.table_names():
+                self.db_conn.drop_table(table_name)
+                app_logger.info(f"Tabela '{table_name}' removida.")
+        except Exception as e:
+            app_logger.warning(f"Falha ao remover a tabela '{table_name}': {e}")
+        # Uma gravação interrompida pode deixar o diretório sem nenhuma versão confirmada.
+        table_dir = table_directory(self.db_conn.uri, table_name)
+        if os.path.isdir(table_dir):
+            shutil.rmtree(table_dir, ignore_errors=True)
+            app_logger.info(f"Diretório restante da tabela '{table_name}' removido.")
+
+    def _prune_table_versions(self, collection_name: str):
+        """
+        Remove versões antigas da coleção, mantendo apenas a ativa e a anterior (para rollback).
+        Tabelas sombra órfãs (de ingestões ou importações interrompidas) também são removidas,
+        exceto as que outro processo ainda está gravando.
+        """
+        state = load_ingest_state(collection_name)
+        keep = {state.get("active_table"), state.get("previous_table")}
+        # A tabela base (sem sufixo de versão) também é considerada: é a versão criada antes das tabelas sombra.
+        candidates = set(state.get("versions", [])) | {get_collection(collection_name)["table"]}
+        version_prefix = table_version_prefix(collection_name)
+        if os.path.isdir(self.db_conn.uri):
+            candidates.update(
+                entry[:-len(".lance")] for entry in os.listdir(self.db_conn.uri)
+                if entry.startswith(version_prefix) and entry.endswith(".lance")
+                # Só o sufixo de timestamp de new_table_version_name: 'kb__v' não pode casar com 'kb__vendas'.
+                and re.fullmatch(r"\d{20}", entry[len(version_prefix):-len(".lance")])
+            )
+        for table_name in sorted(candidates):
+            if table_name not in keep and not is_table_being_written(table_name):
+                self._drop_table_quietly(table_name)
+        kept_versions = [v for v in state.get("versions", []) if v in keep]
+        if kept_versions != state.get("versions", []):
+            save_ingest_state(collection_name, dict(state, versions=kept_versions))
+
+    def rollback_collection(self, collection_name: Optional[str] = None) -> str:
+        """Reativa a versão anterior da coleção, se a tabela dela ainda existir. Retorna o nome da tabela reativada."""
+        collection_name = collection_name or self.collection_name
+        previous_table = load_ingest_state(collection_name).get("previous_table")
+        if not previous_table or previous_table not in self.db_conn.table_names():
+            raise ValueError(f"A coleção '{collection_name}' não possui versão anterior disponível para rollback.")
+        restored_table = rollback_collection(collection_name)
+        self._invalidate_answer_cache(collection_name)
+        return restored_table
+
+    def import_knowledge_base(self, bundle_path: str, collection_name: Optional[str] = None) -> str:
+        """
+        Instala um pacote gerado por export-kb como nova versão da coleção (a do pacote, se nenhuma
+        for informada). Antes de ativá-lo, confere o modelo de embedding, a dimensão dos vetores,
+        o schema, os checksums e o número de linhas; a versão anterior fica disponível para rollback.
+        Retorna o nome da tabela instalada.
+        """
+        manifest = read_bundle_manifest(bundle_path)
+        collection_name = collection_name or manifest["collection"]
+        get_collection(collection_name)
+
+        bundle_model = manifest["embedding_model"]
+        if bundle_model["name"] != self.EMBEDDING_MODEL_NAME:
+            raise ValueError(
+                f"O pacote foi gerado com o modelo de embedding '{bundle_model['name']}', "
+                f"mas este agente usa '{self.EMBEDDING_MODEL_NAME}'."
+            )
+        embedding_dim = len(self._encode("verificação de dimensão"))
+        if bundle_model["dimension"] != embedding_dim:
+            raise ValueError(
+                f"Dimensão dos vetores do pacote ({bundle_model['dimension']}) difere da do modelo local ({embedding_dim})."
+            )
+        expected_schema = schema_signature(self._build_table_schema(embedding_dim))
+        if manifest["schema"] != expected_schema:
+            raise ValueError(f"Schema do pacote incompatível com esta versão do agente: {manifest['schema']}")
 
+        table_name = new_table_version_name(collection_name)
+        app_logger.info(f"Importando pacote '{bundle_path}' na coleção '{collection_name}' (tabela '{table_name}')...")
+        mark_table_writing(table_name)
+        try:
+            install_bundle_table(bundle_path, manifest, self.db_conn.uri, table_name)
+            try:
+                table = self.db_conn.open_table(table_name)
+                if schema_signature(table.schema) != expected_schema or table.count_rows() != manifest["rows"]:
+                    raise ValueError(f"Validação da tabela importada '{table_name}' falhou.")
+                activate_table_version(
+                    collection_name, table_name,
+                    last_ingest_at=manifest["ingest"].get("last_ingest_at"),
+                    embedding_model=bundle_model["name"],
+                    stats=manifest["ingest"].get("stats"),
+                    imported_from=os.path.basename(bundle_path),
+                )
+            except BaseException:
+                shutil.rmtree(table_directory(self.db_conn.uri, table_name), ignore_errors=True)
+                raise
+        finally:
+            clear_table_writing(table_name)
+        self._prune_table_versions(collection_name)
+        self._invalidate_answer_cache(collection_name)
+        app_logger.info(f"Pacote importado: {manifest['rows']} linhas ativas na coleção '{collection_name}'.")
+        return table_name
+
+    def _open_collection_table(self, collection_name: str):
+        """
+        Abre (e mantém em cache) a tabela ativa da coleção. Retorna None se ela ainda não foi ingerida.
+        A cada chamada verifica, por um os.stat do estado da coleção, se outra ingestão ou um rollback
+        trocou a versão ativa; nesse caso reabre a tabela, sem precisar reiniciar o processo.
+        """
+        state_mtime = ingest_state_mtime(collection_name)
+        cached_table = self.tables.get(collection_name)
+        if cached_table is not None and self._table_state_mtimes.get(collection_name) == state_mtime:
+            return cached_table
+
+        table_name = get_active_table_name(collection_name)
+        if cached_table is not None and cached_table.name == table_name:
+            self._table_state_mtimes[collection_name] = state_mtime
+            return cached_table
 
+        try:
+            if table_name not in self.db_conn.table_names():
+                app_logger.error(f"Tabela '{table_name}' da coleção '{collection_name}' não encontrada. Execute a ingestão primeiro.")
+                return None
+            table = self.db_conn.open_table(table_name)
+        except Exception as e_open:
+            app_logger.opt(exception=True).error(f"Erro ao tentar abrir a tabela '{table_name}': {e_open}")
+            return None
+
+        app_logger.info(f"Tabela '{table_name}' (coleção '{collection_name}') aberta com sucesso para retrieve.")
+        self.tables[collection_name] = table
+        self._table_state_mtimes[collection_name] = state_mtime
+        return table
+
+    def refresh_collection_table(self, collection_name: str):
+        """Descarta a tabela em cache da coleção; a próxima busca a reabre (ex: após a manutenção)."""
+        self.tables.pop(collection_name, None)
+        self._table_state_mtimes.pop(collection_name, None)
+
+    def _search_collection(self, collection_name: str, query_embedding: list[float], limit: int) -> list[dict]:
+        """Busca os 'limit' chunks mais próximos em uma coleção, marcando cada resultado com a coleção de origem."""
+        table = self._open_collection_table(collection_name)
+        if table is None:
+            return []
+        try:
+            results = table.search(query_embedding).limit(limit).to_list()
         except Exception as e:
-            app_logger.error(f"Erro durante a ingestão no LanceDB: {e}", exc_info=True)
-            print(f"DEBUG: RAGPipeline ingest_documents: Erro na ingestão no LanceDB: {e}")
-            raise
-        
-        app_logger.info("Processo de ingestão de documentos concluído.")
-        print("DEBUG: RAGPipeline ingest_documents FINALIZADO.")
+            app_logger.opt(exception=True).error(f"Erro ao buscar na coleção '{collection_name}' no LanceDB: {e}")
+            return []
+        for result in results:
+            result["collection"] = collection_name
+        return results
 
-    def retrieve_relevant_chunks(self, query: str) -> list[dict]:
-        print(f"DEBUG: RAGPipeline retrieve_relevant_chunks: Query '{query[:30]}...'")
-        if not self.table:
-            print("DEBUG: RAGPipeline retrieve_relevant_chunks: self.table é None. Tentando abrir.")
-            try:
-                if self.VECTOR_DB_TABLE_NAME in self.db_conn.table_names():
-                    self.table = self.db_conn.open_table(self.VECTOR_DB_TABLE_NAME)
-                    app_logger.info(f"Tabela '{self.VECTOR_DB_TABLE_NAME}' aberta com sucesso para retrieve.")
-                    print(f"DEBUG: RAGPipeline retrieve_relevant_chunks: Tabela '{self.VECTOR_DB_TABLE_NAME}' aberta.")
-                else:
-                    app_logger.error(f"Tabela '{self.VECTOR_DB_TABLE_NAME}' não encontrada. Execute a ingestão primeiro.")
-                    print(f"DEBUG: RAGPipeline retrieve_relevant_chunks: Tabela '{self.VECTOR_DB_TABLE_NAME}' não existe.")
-                    return []
-            except Exception as e_open:
-                app_logger.error(f"Erro ao tentar abrir a tabela '{self.VECTOR_DB_TABLE_NAME}': {e_open}", exc_info=True)
-                print(f"DEBUG: RAGPipeline retrieve_relevant_chunks: Erro ao abrir tabela: {e_open}")
+    def _embed_query(self, query: str) -> Optional[list[float]]:
+        app_logger.debug("Gerando embedding para a query: '{:.50}...'", query)
+        try:
+            return self._encode(query).tolist()
+        except Exception as e:
+            app_logger.opt(exception=True).error(f"Erro ao gerar embedding para a query: {e}")
+            return None
+
+    def retrieve_relevant_chunks(self, query: str, collections: Optional[list[str]] = None,
+                                 query_embedding: Optional[list[float]] = None) -> list[dict]:
+        """
+        Recupera os TOP_K_RESULTS chunks mais relevantes para a query. Com várias coleções,
+        as buscas rodam em paralelo (o embedding da query é calculado uma única vez) e os
+        resultados são mesclados pela distância. 'query_embedding' evita recalcular o embedding
+        quando o chamador já o tem.
+        """
+        collections = collections or [self.collection_name]
+
+        if query_embedding is None:
+            query_embedding = self._embed_query(query)
+            if query_embedding is None:
                 return []
 
-        app_logger.debug(f"Gerando embedding para a query: '{query[:50]}...'")
+        app_logger.debug("Buscando {} chunks relevantes no LanceDB em {}.", self.TOP_K_RESULTS, collections)
+        if len(collections) == 1:
+            results = self._search_collection(collections[0], query_embedding, self.TOP_K_RESULTS)
+        else:
+            if self._search_executor is None:
+                self._search_executor = ThreadPoolExecutor(
+                    max_workers=COLLECTION_SEARCH_WORKERS, thread_name_prefix="kb-search"
+                )
+            futures = [
+                self._search_executor.submit(self._search_collection, name, query_embedding, self.TOP_K_RESULTS)
+                for name in collections
+            ]
+            results = [result for future in futures for result in future.result()]
+            # Todas as coleções usam o mesmo modelo de embedding, então as distâncias são comparáveis.
+            results.sort(key=lambda result: result.get("_distance", float("inf")))
+            results = results[:self.TOP_K_RESULTS]
+
+        hot_path_logger.info("Encontrados {} chunks relevantes.", len(results))
+        return results
+
+    def _format_chunk_citation(self, chunk: dict) -> str:
+        """Monta a referência de fonte do chunk, incluindo página/seção quando conhecidas."""
+        citation = f"Fonte: {chunk.get('source', 'Desconhecida')}"
+        if chunk.get('page') is not None:
+            citation += f", Página {chunk['page']}"
+        if chunk.get('section'):
+            citation += f", Seção '{chunk['section']}'"
+        if chunk.get('row_start') is not None:
+            citation += f", Linhas {chunk['row_start']}-{chunk['row_end']}"
+        citation += f", Chunk {chunk.get('chunk_num', 'N/A')}"
+        other_sources = [src for src in (chunk.get('sources') or []) if src != chunk.get('source')]
+        if other_sources:
+            citation += f" (também em: {', '.join(other_sources)})"
+        return citation
+
+    def _build_prompt(self, query: str, context_chunks: list[dict]) -> str:
+        context_str = "\n\n---\n\n".join([
+            f"{self._format_chunk_citation(chunk)}\n{chunk.get('text', '')}" 
+            for chunk in context_chunks
+        ])
+        return self.PROMPT_TEMPLATE.format(
+            contexto_dos_chunks_recuperados=context_str,
+            pergunta_do_usuario=query
+        )
+
+    def _lookup_cached_answer(self, query_embedding: list[float], context_chunks: list[dict]) -> Optional[str]:
+        if self.answer_cache is None or not context_chunks:
+            return None
+        # O cache é só uma otimização: qualquer falha nele recai na geração normal pelo LLM.
         try:
-            query_embedding = self.embedding_model.encode(query).tolist()
+            return self.answer_cache.lookup(query_embedding, context_chunks, self.EMBEDDING_MODEL_NAME, self.LLM_MODEL)
         except Exception as e:
-            app_logger.error(f"Erro ao gerar embedding para a query: {e}", exc_info=True)
-            print(f"DEBUG: RAGPipeline retrieve_relevant_chunks: Erro ao gerar embedding da query: {e}")
-            return []
+            app_logger.opt(exception=True).warning(f"Falha ao consultar o cache de respostas: {e}")
+            return None
 
-        app_logger.debug(f"Buscando {self.TOP_K_RESULTS} chunks relevantes no LanceDB.")
+    def _store_cached_answer(self, query: str, query_embedding: list[float], context_chunks: list[dict], response: str):
+        if self.answer_cache is None or not context_chunks or response == self.LLM_ERROR_RESPONSE:
+            return
         try:
-            results = self.table.search(query_embedding).limit(self.TOP_K_RESULTS).to_list()
-            app_logger.info(f"Encontrados {len(results)} chunks relevantes.")
-            print(f"DEBUG: RAGPipeline retrieve_relevant_chunks: {len(results)} chunks encontrados.")
-            return results
+            self.answer_cache.store(
+                query, query_embedding, context_chunks, response, self.EMBEDDING_MODEL_NAME, self.LLM_MODEL
+            )
         except Exception as e:
-            app_logger.error(f"Erro ao buscar no LanceDB: {e}", exc_info=True)
-            print(f"DEBUG: RAGPipeline retrieve_relevant_chunks: Erro ao buscar no LanceDB: {e}")
-            return []
+            app_logger.opt(exception=True).warning(f"Falha ao gravar no cache de respostas: {e}")
 
     def generate_response(self, query: str, context_chunks: list[dict]) -> str:
-        print(f"DEBUG: RAGPipeline generate_response: Query '{query[:30]}...', {len(context_chunks)} chunks de contexto.")
         if not context_chunks:
             app_logger.warning("Nenhum chunk de contexto fornecido para generate_response.")
             pass
 
 
-        context_str = "\n\n---\n\n".join([
-            f"Fonte: {chunk.get('source', 'Desconhecida')}, Chunk {chunk.get('chunk_num', 'N/A')}\n{chunk.get('text', '')}" 
-            for chunk in context_chunks
-        ])
-        
-        formatted_prompt = self.PROMPT_TEMPLATE.format(
-            contexto_dos_chunks_recuperados=context_str,
-            pergunta_do_usuario=query
-        )
-        app_logger.debug(f"Prompt formatado para LLM (primeiros 300 chars):\n{formatted_prompt[:300]}...")
-        print(f"DEBUG: RAGPipeline generate_response: Enviando prompt ao LLM '{self.LLM_MODEL}'.")
+        formatted_prompt = self._build_prompt(query, context_chunks)
+        app_logger.debug("Prompt formatado para LLM (primeiros 300 chars):\n{:.300}...", formatted_prompt)
 
         try:
             response = self.ollama_client.chat(
@@ -386,38 +872,126 @@ class RAGPipeline:
             )
             answer = response['message']['content']
             app_logger.info("Resposta recebida do LLM.")
-            app_logger.debug(f"Resposta do LLM: {answer}")
-            print("DEBUG: RAGPipeline generate_response: Resposta LLM recebida.")
+            app_logger.debug("Resposta do LLM: {}", answer)
             return answer
         except Exception as e:
-            app_logger.error(f"Erro ao comunicar com o LLM via Ollama: {e}", exc_info=True)
-            print(f"DEBUG: RAGPipeline generate_response: Erro ao comunicar com LLM: {e}")
-            return "Desculpe, ocorreu um erro ao tentar gerar a resposta (LLM)."
-
-    def answer_query(self, query: str) -> str:
-        print(f"DEBUG: RAGPipeline answer_query: Processando query '{query[:30]}...'")
-        app_logger.info(f"Processando query: '{query}'")
-        relevant_chunks = self.retrieve_relevant_chunks(query)
+            app_logger.opt(exception=True).error(f"Erro ao comunicar com o LLM via Ollama: {e}")
+            return self.LLM_ERROR_RESPONSE
+
+    def answer_query(self, query: str, collections: Optional[list[str]] = None) -> str:
+        app_logger.info("Processando query: '{}'", query)
+        query_embedding = self._embed_query(query)
+        relevant_chunks = self.retrieve_relevant_chunks(query, collections, query_embedding) if query_embedding is not None else []
         if not relevant_chunks:
             app_logger.warning("Nenhum chunk relevante encontrado para a query.")
+
+        cached_response = self._lookup_cached_answer(query_embedding, relevant_chunks)
+        if cached_response is not None:
+            return cached_response
         
         response = self.generate_response(query, relevant_chunks)
-        print("DEBUG: RAGPipeline answer_query FINALIZADO.")
+        self._store_cached_answer(query, query_embedding, relevant_chunks, response)
+        return response
+
+    # --- API assíncrona ---
+    # Embedding (torch), busca (LanceDB) e cache (SQLite) continuam síncronos e rodam em um pool
+    # de threads; a geração usa o cliente assíncrono do Ollama. Assim várias perguntas podem
+    # aguardar o LLM ao mesmo tempo em um único processo (ex: um servidor web com vários usuários).
+    # Cancelar a tarefa ou estourar o tempo de uma etapa lança CancelledError/TimeoutError para o
+    # chamador: a requisição ao Ollama é interrompida, mas uma busca já iniciada termina na sua thread.
+
+    async def _run_in_executor(self, func, *args):
+        if self._async_executor is None:
+            self._async_executor = ThreadPoolExecutor(max_workers=ASYNC_EXECUTOR_WORKERS, thread_name_prefix="kb-async")
+        return await asyncio.get_running_loop().run_in_executor(self._async_executor, func, *args)
+
+    def _get_async_ollama_client(self) -> ollama.AsyncClient:
+        # O cliente HTTP assíncrono fica preso ao event loop em que foi usado pela primeira vez.
+        loop = asyncio.get_running_loop()
+        if self._async_ollama_client is None or self._async_ollama_loop is not loop:
+            self._async_ollama_client = ollama.AsyncClient(host=self.OLLAMA_HOST)
+            self._async_ollama_loop = loop
+        return self._async_ollama_client
+
+    async def _aretrieve_with_embedding(self, query: str, collections: Optional[list[str]]) -> tuple[Optional[list[float]], list[dict]]:
+        query_embedding = await self._run_in_executor(self._embed_query, query)
+        if query_embedding is None:
+            return None, []
+        return query_embedding, await self._run_in_executor(self.retrieve_relevant_chunks, query, collections, query_embedding)
+
+    async def aretrieve(self, query: str, collections: Optional[list[str]] = None,
+                        timeout: Optional[float] = ASYNC_RETRIEVE_TIMEOUT_SECONDS) -> list[dict]:
+        """Versão assíncrona de retrieve_relevant_chunks. Lança TimeoutError se passar de 'timeout' segundos."""
+        _, chunks = await asyncio.wait_for(self._aretrieve_with_embedding(query, collections), timeout)
+        return chunks
+
+    async def agenerate(self, query: str, context_chunks: list[dict],
+                        timeout: Optional[float] = ASYNC_GENERATE_TIMEOUT_SECONDS) -> str:
+        """Versão assíncrona de generate_response. Lança TimeoutError se passar de 'timeout' segundos."""
+        if not context_chunks:
+            app_logger.warning("Nenhum chunk de contexto fornecido para agenerate.")
+
+        formatted_prompt = self._build_prompt(query, context_chunks)
+        app_logger.debug("Prompt formatado para LLM (primeiros 300 chars):\n{:.300}...", formatted_prompt)
+
+        try:
+            response = await asyncio.wait_for(
+                self._get_async_ollama_client().chat(
+                    model=self.LLM_MODEL,
+                    messages=[{'role': 'user', 'content': formatted_prompt}]
+                ),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            app_logger.warning(f"Geração pelo LLM excedeu {timeout}s e foi cancelada.")
+            raise
+        except Exception as e:
+            app_logger.opt(exception=True).error(f"Erro ao comunicar com o LLM via Ollama: {e}")
+            return self.LLM_ERROR_RESPONSE
+        answer = response['message']['content']
+        app_logger.info("Resposta recebida do LLM.")
+        app_logger.debug("Resposta do LLM: {}", answer)
+        return answer
+
+    async def aanswer_query(self, query: str, collections: Optional[list[str]] = None,
+                            retrieve_timeout: Optional[float] = ASYNC_RETRIEVE_TIMEOUT_SECONDS,
+                            generate_timeout: Optional[float] = ASYNC_GENERATE_TIMEOUT_SECONDS) -> str:
+        """Versão assíncrona de answer_query, com limite de tempo por etapa (recuperação e geração)."""
+        app_logger.info("Processando query: '{}'", query)
+        query_embedding, relevant_chunks = await asyncio.wait_for(
+            self._aretrieve_with_embedding(query, collections), retrieve_timeout
+        )
+        if not relevant_chunks:
+            app_logger.warning("Nenhum chunk relevante encontrado para a query.")
+
+        cached_response = await self._run_in_executor(self._lookup_cached_answer, query_embedding, relevant_chunks)
+        if cached_response is not None:
+            return cached_response
+
+        response = await self.agenerate(query, relevant_chunks, generate_timeout)
+        await self._run_in_executor(self._store_cached_answer, query, query_embedding, relevant_chunks, response)
         return response
 
     def close(self): 
-        print("DEBUG: RAGPipeline close INICIADO.")
         app_logger.info("Fechando RAGPipeline...")
         app_logger.debug("Conexão LanceDB não requer fechamento explícito.")
+
+        if self._search_executor is not None:
+            self._search_executor.shutdown(wait=False)
+            self._search_executor = None
+        if self._async_executor is not None:
+            self._async_executor.shutdown(wait=False)
+            self._async_executor = None
+        self._idle_monitor_stop.set()
+        if self.answer_cache is not None:
+            self.answer_cache.close()
+        if self.embedding_client is not None:
+            self.embedding_client.close_connection()
         
         if hasattr(self, 'embedding_model') and self.embedding_model:
             del self.embedding_model
             self.embedding_model = None
             app_logger.info("Referência ao modelo de embedding removida.")
-            print("DEBUG: RAGPipeline close: Referência ao embedding_model removida.")
         
         gc.collect()
         app_logger.info("RAGPipeline finalizada.")
-        print("DEBUG: RAGPipeline close FINALIZADO.")
-
-print("DEBUG: Script rag_pipeline.py FINALIZADO (após tudo).")
\ No newline at end of file
@@ -0,0 +1,253 @@
+# servico_embeddings.py
+import base64
+import json
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+import numpy as np
+
+from config import (
+    EMBEDDING_MODEL_NAME, EMBEDDING_SERVICE_HOST, EMBEDDING_SERVICE_PORT, EMBEDDING_SERVICE_TIMEOUT_SECONDS,
+    EMBEDDING_SERVICE_PING_TIMEOUT_SECONDS, EMBEDDING_SERVICE_MAX_BATCH, EMBEDDING_SERVICE_MAX_WAIT_MS
+)
+from utils import app_logger, hot_path_logger
+
+# Protocolo: cada mensagem é um JSON em UTF-8 precedido do seu tamanho (4 bytes, big-endian).
+# Requisições: {"op": "ping"} ou {"op": "encode", "model": ..., "texts": [...]}.
+# Respostas: {"ok": true, "model": ..., "dim": ..., "vectors": <float32 em base64>} ou {"ok": false, "error": ...}.
+_HEADER = struct.Struct(">I")
+_MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+class EmbeddingServiceError(RuntimeError):
+    """Falha ao obter embeddings do serviço compartilhado."""
+
+
+def _send_message(sock: socket.socket, payload: dict):
+    data = json.dumps(payload).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("Conexão encerrada pelo outro lado.")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def _recv_message(sock: socket.socket) -> dict:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > _MAX_MESSAGE_BYTES:
+        raise EmbeddingServiceError(f"Mensagem de {size} bytes excede o limite de {_MAX_MESSAGE_BYTES}.")
+    try:
+        message = json.loads(_recv_exact(sock, size).decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise EmbeddingServiceError(f"Resposta fora do protocolo do serviço de embeddings: {e}") from e
+    if not isinstance(message, dict):
+        raise EmbeddingServiceError("Resposta fora do protocolo do serviço de embeddings.")
+    return message
+
+
+class _DynamicBatcher:
+    """
+    Agrupa requisições de todos os clientes em um único encode: espera a primeira requisição
+    e então junta as seguintes até EMBEDDING_SERVICE_MAX_BATCH textos ou até
+    EMBEDDING_SERVICE_MAX_WAIT_MS, o que vier primeiro.
+    """
+
+    def __init__(self, model, max_batch: int, max_wait_ms: int):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait_seconds = max_wait_ms / 1000
+        self._requests = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list[str]) -> Future:
+        future = Future()
+        self._requests.put((texts, future))
+        return future
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            batch_texts = len(first[0])
+            deadline = time.monotonic() + self.max_wait_seconds
+            while batch_texts < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                batch_texts += len(item[0])
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch: list):
+        all_texts = [text for texts, _ in batch for text in texts]
+        try:
+            vectors = np.asarray(
+                self.model.encode(all_texts, show_progress_bar=False, batch_size=self.max_batch),
+                dtype=np.float32
+            )
+        except Exception as e:
+            app_logger.opt(exception=True).error(f"Erro ao gerar embeddings no serviço: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        hot_path_logger.debug("Serviço de embeddings: {} requisições agrupadas em um lote de {} textos.", len(batch), len(all_texts))
+        offset = 0
+        for texts, future in batch:
+            future.set_result(vectors[offset:offset + len(texts)])
+            offset += len(texts)
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                request = _recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                _send_message(self.request, {"ok": False, "error": str(e)})
+                return
+
+            op = request.get("op")
+            if op == "ping":
+                _send_message(self.request, {"ok": True, "model": server.model_name})
+            elif op == "encode":
+                if request.get("model") != server.model_name:
+                    _send_message(self.request, {
+                        "ok": False,
+                        "error": f"Serviço usa o modelo '{server.model_name}', requisição pediu '{request.get('model')}'."
+                    })
+                    continue
+                try:
+                    vectors = server.batcher.submit(list(request.get("texts", []))).result(timeout=EMBEDDING_SERVICE_TIMEOUT_SECONDS)
+                    _send_message(self.request, {
+                        "ok": True,
+                        "model": server.model_name,
+                        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+                        "vectors": base64.b64encode(vectors.tobytes()).decode("ascii"),
+                    })
+                except Exception as e:
+                    _send_message(self.request, {"ok": False, "error": str(e)})
+            else:
+                _send_message(self.request, {"ok": False, "error": f"Operação desconhecida: {op!r}"})
+
+
+class EmbeddingService(socketserver.ThreadingTCPServer):
+    """Serviço local (apenas localhost) que mantém um único modelo de embedding carregado para vários processos."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, model, model_name: str = EMBEDDING_MODEL_NAME, host: str = EMBEDDING_SERVICE_HOST,
+                 port: int = EMBEDDING_SERVICE_PORT, max_batch: int = EMBEDDING_SERVICE_MAX_BATCH,
+                 max_wait_ms: int = EMBEDDING_SERVICE_MAX_WAIT_MS):
+        self.model_name = model_name
+        self.batcher = _DynamicBatcher(model, max_batch, max_wait_ms)
+        super().__init__((host, port), _EmbeddingRequestHandler)
+
+    def server_close(self):
+        self.batcher.stop()
+        super().server_close()
+
+
+def serve_embeddings(host: str = EMBEDDING_SERVICE_HOST, port: int = EMBEDDING_SERVICE_PORT):
+    """Carrega o modelo de embedding e atende clientes até ser interrompido (Ctrl+C)."""
+    from sentence_transformers import SentenceTransformer
+
+    app_logger.info(f"Carregando modelo de embedding para o serviço: {EMBEDDING_MODEL_NAME}")
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, trust_remote_code=True)
+    with EmbeddingService(model, host=host, port=port) as service:
+        app_logger.info(f"Serviço de embeddings em {host}:{port} (modelo '{EMBEDDING_MODEL_NAME}').")
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            app_logger.info("Serviço de embeddings interrompido pelo usuário.")
+
+
+class EmbeddingServiceClient:
+    """
+    Cliente do serviço de embeddings. Mantém uma conexão persistente (reaberta após falhas)
+    e expõe encode() com o mesmo formato de retorno do SentenceTransformer.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, host: str = EMBEDDING_SERVICE_HOST,
+                 port: int = EMBEDDING_SERVICE_PORT, timeout: float = EMBEDDING_SERVICE_TIMEOUT_SECONDS):
+        self.model_name = model_name
+        self.address = (host, port)
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _request(self, payload: dict, timeout: Optional[float] = None, attempts: int = 2) -> dict:
+        timeout = timeout or self.timeout
+        with self._lock:
+            for attempt in range(attempts):
+                try:
+                    if self._sock is None:
+                        self._sock = socket.create_connection(self.address, timeout=timeout)
+                    self._sock.settimeout(timeout)
+                    _send_message(self._sock, payload)
+                    return _recv_message(self._sock)
+                except EmbeddingServiceError:
+                    # Resposta inválida (ex: outro programa na porta): a conexão fica dessincronizada.
+                    self.close_connection()
+                    raise
+                except (ConnectionError, OSError) as e:
+                    self.close_connection()
+                    # Uma nova tentativa cobre conexões persistentes encerradas pelo servidor.
+                    if attempt == attempts - 1:
+                        raise EmbeddingServiceError(f"Serviço de embeddings indisponível em {self.address}: {e}") from e
+
+    def close_connection(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def is_available(self) -> bool:
+        """Indica se o serviço está em execução e usa o mesmo modelo deste cliente."""
+        try:
+            response = self._request({"op": "ping"}, timeout=EMBEDDING_SERVICE_PING_TIMEOUT_SECONDS, attempts=1)
+        except EmbeddingServiceError as e:
+            app_logger.debug("Serviço de embeddings não respondeu ao ping: {}", e)
+            return False
+        if response.get("model") != self.model_name:
+            app_logger.warning(f"Serviço de embeddings usa o modelo '{response.get('model')}', esperado '{self.model_name}'.")
+            return False
+        return bool(response.get("ok"))
+
+    def encode(self, texts, **_encode_kwargs) -> np.ndarray:
+        single_text = isinstance(texts, str)
+        response = self._request({"op": "encode", "model": self.model_name, "texts": [texts] if single_text else list(texts)})
+        if not response.get("ok"):
+            raise EmbeddingServiceError(response.get("error", "Erro desconhecido no serviço de embeddings."))
+        vectors = np.frombuffer(base64.b64decode(response["vectors"]), dtype=np.float32)
+        vectors = vectors.reshape(-1, response["dim"]) if response["dim"] else vectors.reshape(0, 0)
+        return vectors[0] if single_text else vectors
@@ -45,7 +45,7 @@ def translate_excel_advanced(excel_filepath: str, output_txt_filepath: str):
         xls = pd.ExcelFile(excel_filepath)
         ollama_client = ollama.Client(host=OLLAMA_HOST)
     except Exception as e:
-        app_logger.error(f"Erro ao inicializar dependências (pandas ou ollama): {e}", exc_info=True)
+        app_logger.opt(exception=True).error(f"Erro ao inicializar dependências (pandas ou ollama): {e}")
         return
 
     full_text_description = []
@@ -56,7 +56,7 @@ def translate_excel_advanced(excel_filepath: str, output_txt_filepath: str):
         try:
             df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str).fillna("")
         except Exception as e:
-            app_logger.error(f"Erro ao ler a planilha '{sheet_name}': {e}", exc_info=True)
+            app_logger.opt(exception=True).error(f"Erro ao ler a planilha '{sheet_name}': {e}")
             continue
         
         if df.empty:
@@ -92,7 +92,7 @@ def translate_excel_advanced(excel_filepath: str, output_txt_filepath: str):
                 app_logger.info(f"Descrição do chunk {i+1} recebida com sucesso.")
             except Exception as e:
                 error_message = f"Erro ao comunicar com o LLM para o chunk {i+1}: {e}"
-                app_logger.error(error_message, exc_info=True)
+                app_logger.opt(exception=True).error(error_message)
                 full_text_description.append(f"[[ERRO AO PROCESSAR ESTA PARTE DOS DADOS: {error_message}]]\n\n---\n\n")
 
     if not full_text_description:
@@ -109,7 +109,7 @@ def translate_excel_advanced(excel_filepath: str, output_txt_filepath: str):
         app_logger.info(f"Tradução avançada salva com sucesso em: {output_txt_filepath}")
         print(f"Arquivo de texto gerado salvo em: {output_txt_filepath}")
     except Exception as e:
-        app_logger.error(f"Erro ao salvar o arquivo de texto {output_txt_filepath}: {e}", exc_info=True)
+        app_logger.opt(exception=True).error(f"Erro ao salvar o arquivo de texto {output_txt_filepath}: {e}")
 
 
 if __name__ == "__main__":
@@ -1,29 +1,84 @@
 # utils.py
+import itertools
 import sys
+from collections import defaultdict
+from typing import Optional
+
 from loguru import logger
-from config import LOG_FILE_PATH, LOG_LEVEL # Certifique-se que config.py está ok
+from config import LOG_FILE_PATH, LOG_LEVEL, LOG_JSON, LOG_JSON_FILE_PATH, LOG_ENQUEUE, LOG_SAMPLE_EVERY # Certifique-se que config.py está ok
+
+# Contadores por ponto de chamada (módulo, linha) dos eventos amostrados.
+_sample_counters = defaultdict(itertools.count)
+
+
+def _sampling_patcher(record):
+    """
+    Marca registros amostrados que devem ser descartados. Roda uma única vez por registro,
+    antes dos sinks, e só para registros no nível ativo: mensagens DEBUG com o logger em
+    INFO nem chegam aqui.
+    """
+    every = record["extra"].get("sample_every")
+    if every and every > 1:
+        record["extra"]["sampled_out"] = next(_sample_counters[(record["name"], record["line"])]) % every != 0
+
+
+def _keep_record(record) -> bool:
+    return not record["extra"].get("sampled_out", False)
+
+
+def setup_logger(level: Optional[str] = None, json_output: Optional[bool] = None):
+    """
+    Configura o logger para o projeto. Os sinks usam fila (enqueue): a formatação e a
+    escrita em disco/terminal acontecem em uma thread de fundo. Com json_output, os
+    registros também são gravados em JSON em LOG_JSON_FILE_PATH.
+    """
+    level = level or LOG_LEVEL
+    json_output = LOG_JSON if json_output is None else json_output
 
-def setup_logger():
-    """Configura o logger para o projeto."""
     logger.remove()
+    logger.configure(patcher=_sampling_patcher)
     logger.add(
         sys.stderr,
-        level=LOG_LEVEL,
+        level=level,
+        enqueue=LOG_ENQUEUE,
+        filter=_keep_record,
         format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
     )
     logger.add(
         LOG_FILE_PATH,
-        level=LOG_LEVEL,
+        level=level,
+        enqueue=LOG_ENQUEUE,
+        filter=_keep_record,
         rotation="10 MB",
         retention="7 days",
         format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
     )
+    if json_output:
+        logger.add(
+            LOG_JSON_FILE_PATH,
+            level=level,
+            enqueue=LOG_ENQUEUE,
+            filter=_keep_record,
+            serialize=True,
+            rotation="10 MB",
+            retention="7 days"
+        )
     return logger
 
 # Esta é a linha crucial para exportar o app_logger:
 app_logger = setup_logger()
 
+# Logger para eventos de alta frequência (por lote, por chunk, por consulta): apenas 1 a cada
+# LOG_SAMPLE_EVERY registros de cada ponto de chamada é gravado. O campo 'sample_every' vai
+# junto no JSON para que as contagens possam ser reescaladas na análise.
+hot_path_logger = app_logger.bind(sample_every=LOG_SAMPLE_EVERY)
+
+# Mensagens de debug devem usar argumentos em vez de f-strings, ex:
+#   app_logger.debug("Lote de {} chunks gravado na tabela '{}'.", len(chunks), table_name)
+# Assim a mensagem só é formatada se algum sink aceitar o nível. Para valores caros de
+# calcular, use app_logger.opt(lazy=True).debug("...: {}", lambda: valor_caro()).
+
 # Para testar se este arquivo está ok, você pode adicionar temporariamente:
 # if __name__ == "__main__":
 #     app_logger.info("Logger do utils.py funcionando!")
-# E então executar: python utils.py
\ No newline at end of file
+# E então executar: python utils.py